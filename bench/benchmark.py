@@ -0,0 +1,166 @@
+"""Load benchmark for BCBotJailTimer against the local fake server.
+
+For each room size it measures:
+- inbound events/s the bot handles (ChatRoomSyncItem bursts)
+- command-to-reply latency for `N 时间 <id>`, one command per chat window
+- outbound emit rate while sentencing every member
+- timer expiry lateness (how long after its deadline on_finish runs)
+
+    python -m bench.benchmark --sizes 10 100 1000
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from bench.fake_server import FakeBCServer
+from bot_jail_timer import BCBotJailTimer
+
+ROOM_NAME = "bench room"
+ADMIN = 1
+FIRST_MEMBER = 1000
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def wait_until(predicate, timeout: float = 60, interval: float = 0.001):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise asyncio.TimeoutError
+        await asyncio.sleep(interval)
+
+
+async def start_bot(server: FakeBCServer, **bot_kwargs) -> BCBotJailTimer:
+    kwargs = {
+        "username": "benchbot",
+        "password": "x",
+        "chatroom_settings": {"Name": ROOM_NAME, "Admin": [ADMIN], "Ban": [], "Limit": 10000},
+        "timer_db_path": ":memory:",
+        "server_url": server.url,
+    }
+    kwargs.update(bot_kwargs)
+    bot = BCBotJailTimer(**kwargs)
+    bot._run_task = asyncio.create_task(bot.run())
+    await wait_until(lambda: bot.current_chatroom is not None, timeout=30)
+    return bot
+
+
+async def stop_bot(bot: BCBotJailTimer):
+    bot._run_task.cancel()
+    try:
+        await bot._run_task
+    except asyncio.CancelledError:
+        pass
+
+
+async def bench_size(server: FakeBCServer, size: int, record_path: str = None) -> dict:
+    server.create_room({"Name": ROOM_NAME, "Admin": [ADMIN], "Ban": [], "Limit": 10000})
+    await server.add_virtual_member(ROOM_NAME, ADMIN, announce=False)
+    bot = await start_bot(server, record_path=record_path)
+    members = list(range(FIRST_MEMBER, FIRST_MEMBER + size))
+    result = {"size": size}
+
+    # inbound: members joining plus 10 item changes each
+    started = time.monotonic()
+    for m in members:
+        await server.add_virtual_member(ROOM_NAME, m)
+    for i in range(10):
+        for m in members:
+            await server.sync_item(ROOM_NAME, m, f"Bench{i}", "BenchItem")
+    last = members[-1]
+    await wait_until(
+        lambda: last in bot.others and bot.others[last].appearance.get("Bench9") is not None
+    )
+    inbound = size * (1 + 1 + 10)  # SyncMemberJoin + ServerEnter + 10 SyncItem
+    result["inbound_events_per_s"] = inbound / (time.monotonic() - started)
+
+    # outbound: sentence everyone, count what reaches the server
+    sent_before = len(server.received)
+    queue_sent_before = bot.event_queue.stats["sent"]
+    started = time.monotonic()
+    for m in members:
+        await server.broadcast_message(ROOM_NAME, ADMIN, f"N 审判 {m} 1天")
+    await wait_until(lambda: len(bot.timer_list) == size)
+    # the sender pops an event before it is on the wire, so wait for the server to see all of them
+    await wait_until(
+        lambda: bot.chat_coalescer._flush_task is None
+        and bot.event_queue.depth == 0
+        and len(server.received) - sent_before == bot.event_queue.stats["sent"] - queue_sent_before
+    )
+    emitted = [r for r in server.received[sent_before:] if r[2] == "ChatRoomChat"]
+    elapsed = (emitted[-1][0] - started) if emitted else float("nan")
+    result["sentence_commands"] = size
+    result["chat_emits"] = len(emitted)
+    result["emits_per_s"] = len(emitted) / elapsed if emitted else 0
+
+    # command-to-reply latency
+    latencies = []
+    for m in members[:min(size, 20)]:
+        reply = asyncio.get_running_loop().create_future()
+
+        def listener(sid, event, data, m=m, reply=reply):
+            if event == "ChatRoomChat" and str(m) in data["Content"] and not reply.done():
+                reply.set_result(time.monotonic())
+        server.listeners.append(listener)
+        started = time.monotonic()
+        await server.broadcast_message(ROOM_NAME, ADMIN, f"N 时间 {m}")
+        latencies.append(await asyncio.wait_for(reply, 30) - started)
+        server.listeners.remove(listener)
+        # let the coalescing window close, like an admin typing commands
+        await asyncio.sleep(bot.chat_coalescer.window)
+    result["reply_latency_p50_ms"] = statistics.median(latencies) * 1000
+    result["reply_latency_max_ms"] = max(latencies) * 1000
+
+    # expiry lateness: restart every timer with a short random-ish deadline
+    lateness = []
+    finish = bot._on_finish
+
+    async def on_finish(id):
+        lateness.append(bot.timer_engine.now() - deadlines[id])
+        await finish(id)
+    bot._on_finish = on_finish
+    deadlines = {}
+    for i, m in enumerate(members):
+        await bot.sentence(m, 1 + (i % 10) / 10)
+        deadlines[m] = bot.timer_list[m]._deadline
+    await wait_until(lambda: len(lateness) == size, timeout=30)
+    result["expiry_lateness_p50_ms"] = percentile(lateness, 0.5) * 1000
+    result["expiry_lateness_p99_ms"] = percentile(lateness, 0.99) * 1000
+
+    await stop_bot(bot)
+    server.rooms.clear()
+    return result
+
+
+async def main(sizes, port, record_path=None):
+    server = FakeBCServer(port=port)
+    await server.start()
+    try:
+        for size in sizes:
+            path = record_path.replace("{size}", str(size)) if record_path else None
+            result = await bench_size(server, size, path)
+            print(" | ".join(
+                f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}"
+                for k, v in result.items()
+            ))
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--record", help="record the bot's traffic, e.g. traffic_{size}.jsonl.gz")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    asyncio.run(main(args.sizes, args.port, args.record))
@@ -0,0 +1,87 @@
+"""Decode-time micro-benchmark for the socket.io JSON codecs.
+
+Payloads are read from the given JSON files (e.g. recorded ChatRoomSync
+events), or synthesized ChatRoomSync rooms of 10/100/1000 members when
+no files are given. For each codec it reports the time to decode the
+payload alone and the per-event latency of a full socket.io packet
+decode plus BCBot.on_ChatRoomSync.
+
+    python -m bench.codec_benchmark [payload.json ...]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from socketio import packet
+
+from bench.fake_server import make_character
+from bot import BCBot
+from utils.codec import OrjsonCodec, StdlibCodec, orjson
+
+
+def synthesized_payloads() -> dict:
+    payloads = {}
+    for size in (10, 100, 1000):
+        payloads[f"sync_{size}"] = {
+            "Name": "bench room", "Admin": [1], "Ban": [], "Limit": size,
+            "Character": [make_character(1000 + i) for i in range(size)],
+        }
+    return payloads
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def bench_payload(name: str, payload: dict, codecs: list, repeat: int):
+    raw = json.dumps(payload)
+    encoded = packet.Packet(packet.EVENT, data=["ChatRoomSync", payload]).encode()
+    bot = BCBot("bench", "x", {"Name": "bench room", "Admin": []})
+    bot.player = {"MemberNumber": 1, "SubmissivesList": []}
+
+    for codec in codecs:
+        decode = best_of(lambda: codec.loads(raw), repeat)
+
+        packet.Packet.json = codec
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            event = packet.Packet(encoded_packet=encoded)
+            await bot.on_ChatRoomSync(event.data[1])
+            latencies.append(time.perf_counter() - started)
+        print(
+            f"{name:>12} | {len(raw) / 1024:8.1f} KiB | {codec.name:>6} | "
+            f"decode {decode * 1000:8.3f} ms | event {min(latencies) * 1000:8.3f} ms"
+        )
+
+
+async def main(paths: list, repeat: int):
+    if paths:
+        payloads = {}
+        for path in paths:
+            with open(path) as f:
+                payloads[path] = json.load(f)
+    else:
+        payloads = synthesized_payloads()
+
+    codecs = [StdlibCodec] + ([OrjsonCodec] if orjson is not None else [])
+    if orjson is None:
+        print("orjson is not installed, only measuring json")
+    for name, payload in payloads.items():
+        await bench_payload(name, payload, codecs, repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("payloads", nargs="*", help="JSON files holding one event payload each")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(main(args.payloads, args.repeat))
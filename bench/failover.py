@@ -0,0 +1,191 @@
+"""Hot-standby failover benchmark against the local fake server.
+
+An active node runs in a child process and a standby node in this one,
+sharing one SQLite timer store and lease. After sentencing some players the
+active process is killed with SIGKILL, and the benchmark reports:
+- detection: kill until the standby holds the lease (bounded by --ttl)
+- rejoin: lease acquired until the standby is back in the room
+- whether every sentence survived the failover
+- appearance code startup cost, cold decode vs cache
+- AccountUpdate bytes sent per join (the first join, the takeover, a reconnect)
+
+    python -m bench.failover --ttl 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from lzstring import LZString
+
+from bench.benchmark import ROOM_NAME, ADMIN, FIRST_MEMBER, wait_until
+from bench.fake_server import FakeBCServer
+from bot_jail_timer import BCBotJailTimer
+from utils.appearance import decode_appearance_code
+from utils.connection_supervisor import ConnectionState
+from utils.hot_standby import HotStandby
+from utils.lease import Lease
+
+ROOM = {"Name": ROOM_NAME, "Admin": [ADMIN], "Ban": [], "Limit": 100}
+
+
+def make_appearance_code(items: int = 80) -> str:
+    appearance = [
+        {
+            "Group": f"Group{g}",
+            "Name": f"Item{g}",
+            "Color": ["#A0A0A0", "#202020", "Default"],
+            "Property": {"Type": f"t{g % 4}", "Effect": ["Slow"] if g % 3 else []},
+        }
+        for g in range(items)
+    ]
+    return LZString.compressToBase64(json.dumps(appearance))
+
+
+def make_bot(url: str, db_path: str, appearance_code: str, cache_dir: str) -> BCBotJailTimer:
+    return BCBotJailTimer(
+        username="benchbot",
+        password="x",
+        chatroom_settings=ROOM,
+        appearance_code=appearance_code,
+        appearance_cache_dir=cache_dir,
+        timer_db_path=db_path,
+        timer_flush_interval=0.5,
+        server_url=url,
+    )
+
+
+def _run_node(url, db_path, ttl, appearance_code, cache_dir):
+    logging.disable(logging.CRITICAL)
+    lease = Lease(db_path, name=ROOM_NAME, ttl=ttl, holder="active")
+    node = HotStandby(lambda: make_bot(url, db_path, appearance_code, cache_dir), lease, poll_interval=0.1)
+    asyncio.run(node.run())
+
+
+def count_timers(db_path: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        try:
+            return conn.execute("SELECT COUNT(*) FROM timers").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+
+def startup_times(appearance_code: str, cache_dir: str) -> dict:
+    started = time.perf_counter()
+    json.loads(LZString.decompressFromBase64(appearance_code))
+    uncached = time.perf_counter() - started
+    decode_appearance_code(appearance_code, cache_dir)  # fills the cache
+    started = time.perf_counter()
+    decode_appearance_code(appearance_code, cache_dir)
+    cached = time.perf_counter() - started
+    return {"decode_uncached_ms": uncached * 1000, "decode_cached_ms": cached * 1000}
+
+
+def account_update_bytes(server: FakeBCServer, since: int) -> int:
+    return sum(
+        len(json.dumps(data, separators=(",", ":")))
+        for _, _, event, data in server.received[since:]
+        if event == "AccountUpdate"
+    )
+
+
+async def main(port: int, ttl: float, sentences: int):
+    tmp = tempfile.mkdtemp(prefix="bc_failover_")
+    db_path = os.path.join(tmp, "timers.db")
+    cache_dir = os.path.join(tmp, "cache")
+    appearance_code = make_appearance_code()
+    result = {"lease_ttl_s": ttl}
+    result.update(startup_times(appearance_code, os.path.join(tmp, "startup_cache")))
+
+    server = FakeBCServer(port=port)
+    await server.start()
+    server.create_room(ROOM)
+    await server.add_virtual_member(ROOM_NAME, ADMIN, announce=False)
+    members = list(range(FIRST_MEMBER, FIRST_MEMBER + sentences))
+    for m in members:
+        await server.add_virtual_member(ROOM_NAME, m, announce=False)
+
+    def in_room(sid) -> bool:
+        return sid is not None and server.room_of.get(sid) == ROOM_NAME
+
+    active = multiprocessing.get_context("spawn").Process(
+        target=_run_node, args=(server.url, db_path, ttl, appearance_code, cache_dir), daemon=True,
+    )
+    standby = None
+    standby_task = None
+    try:
+        active.start()
+        await wait_until(lambda: in_room(server.sessions.get("benchbot")), timeout=60, interval=0.01)
+        active_sid = server.sessions["benchbot"]
+
+        for m in members:
+            await server.broadcast_message(ROOM_NAME, ADMIN, f"N 审判 {m} 1天")
+        await wait_until(lambda: count_timers(db_path) == sentences, timeout=30, interval=0.05)
+        result["first_join_account_update_bytes"] = account_update_bytes(server, 0)
+
+        standby = HotStandby(
+            lambda: make_bot(server.url, db_path, appearance_code, cache_dir),
+            Lease(db_path, name=ROOM_NAME, ttl=ttl, holder="standby"),
+            poll_interval=0.1,
+        )
+        standby_task = asyncio.create_task(standby.run())
+        await wait_until(lambda: standby.bot is not None and len(standby.bot.timer_list) == sentences)
+
+        received_before = len(server.received)
+        killed_at = time.monotonic()
+        active.kill()
+        await wait_until(lambda: standby.metrics["last_takeover_at"] is not None, timeout=ttl * 3, interval=0.005)
+        await wait_until(
+            lambda: standby.bot.supervisor is not None
+            and standby.bot.supervisor.state == ConnectionState.IN_ROOM
+            and in_room(server.sessions.get("benchbot"))
+            and server.sessions["benchbot"] != active_sid,
+            interval=0.005,
+        )
+        in_room_at = time.monotonic()
+        takeover_at = standby.metrics["last_takeover_at"]
+        result["detection_s"] = takeover_at - killed_at
+        result["rejoin_s"] = in_room_at - takeover_at
+        result["failover_s"] = in_room_at - killed_at
+        timers = standby.bot.timer_list
+        result["sentences_kept"] = f"{sum(1 for m in members if m in timers)}/{sentences}"
+        result["sentences_running"] = sum(1 for t in timers.values() if t._running)
+        result["takeover_account_update_bytes"] = account_update_bytes(server, received_before)
+
+        # a plain reconnect of the new active node
+        received_before = len(server.received)
+        sessions = standby.bot.supervisor.metrics["sessions"]
+        await server.drop_all_clients()
+        await wait_until(lambda: standby.bot.supervisor.metrics["sessions"] > sessions, timeout=30)
+        result["reconnect_account_update_bytes"] = account_update_bytes(server, received_before)
+    finally:
+        if active.is_alive():
+            active.kill()
+        if standby_task is not None:
+            standby_task.cancel()
+            await asyncio.gather(standby_task, return_exceptions=True)
+        await server.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--ttl", type=float, default=3.0, help="lease TTL in seconds (LEASE_TTL)")
+    parser.add_argument("--sentences", type=int, default=20)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    result = asyncio.run(main(args.port, args.ttl, args.sentences))
+    print(" | ".join(
+        f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+        for k, v in result.items()
+    ))
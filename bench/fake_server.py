@@ -0,0 +1,250 @@
+"""A local stand-in for the Bondage Club server.
+
+Only the events BCBot uses are emulated. Besides real socket.io clients,
+rooms can hold "virtual" members that exist only on the server, so load
+tests can fill a room with hundreds of players without opening hundreds
+of sockets.
+
+    python -m bench.fake_server --port 8765
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import socketio
+from aiohttp import web
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def make_character(member_number: int, name: str = None, items: int = 20) -> dict:
+    return {
+        "MemberNumber": member_number,
+        "Name": name or f"Player{member_number}",
+        "Ownership": None,
+        "Appearance": [
+            {"Group": f"Group{g}", "Name": f"Item{g}", "Color": "Default"}
+            for g in range(items)
+        ],
+        "Inventory": [{"Group": f"Group{g}", "Name": f"Item{g}"} for g in range(items * 5)],
+        "OnlineSharedSettings": {"GameVersion": "R100"},
+    }
+
+
+class FakeRoom:
+    def __init__(self, settings: dict):
+        self.settings = dict(settings)
+        self.name = settings["Name"]
+        self.characters = {}  # MemberNumber -> character
+        self.sids = {}  # MemberNumber -> sid, socket members only
+
+    def sync_payload(self) -> dict:
+        data = {k: v for k, v in self.settings.items()}
+        data["Character"] = list(self.characters.values())
+        return data
+
+
+class FakeBCServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765):
+        self.host = host
+        self.port = port
+        self.sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*")
+        self.app = web.Application()
+        self.sio.attach(self.app)
+        self._runner = None
+        self._member_numbers = itertools.count(100000)
+        self.accounts = {}  # sid -> character
+        self.characters = {}  # AccountName -> character, kept across logins
+        self.sessions = {}  # AccountName -> sid of its live session
+        self.rooms = {}  # name -> FakeRoom
+        self.room_of = {}  # sid -> room name
+        self.received = []  # (monotonic time, sid, event, data)
+        self.listeners = []  # callables(sid, event, data)
+        self.login_queue = 0
+
+        for event in (
+            "AccountLogin", "AccountUpdate", "ChatRoomSearch", "ChatRoomCreate",
+            "ChatRoomJoin", "ChatRoomLeave", "ChatRoomChat", "ChatRoomCharacterItemUpdate",
+        ):
+            self.sio.on(event, self._make_handler(event))
+        self.sio.on("disconnect", self._on_disconnect)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Fake server listening on %s", self.url)
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _make_handler(self, event):
+        handler = getattr(self, f"_on_{event}")
+
+        async def _handler(sid, data=None):
+            self.received.append((time.monotonic(), sid, event, data))
+            for listener in self.listeners:
+                listener(sid, event, data)
+            await handler(sid, data)
+        return _handler
+
+    # --- client events ---
+
+    async def _on_AccountLogin(self, sid, data):
+        for position in range(self.login_queue, 0, -1):
+            await self.sio.emit("LoginQueue", position, to=sid)
+            await asyncio.sleep(0.05)
+        if not data.get("AccountName"):
+            await self.sio.emit("LoginResponse", "InvalidNamePassword", to=sid)
+            return
+        name = data["AccountName"]
+        character = self.characters.get(name)
+        if character is None:
+            character = self.characters[name] = make_character(next(self._member_numbers), name, items=0)
+            character["SubmissivesList"] = []
+        # like the real server, a new login ends the account's previous session
+        previous = self.sessions.get(name)
+        if previous is not None and previous != sid and previous in self.accounts:
+            await self.sio.disconnect(previous)
+        self.sessions[name] = sid
+        self.accounts[sid] = character
+        await self.sio.emit("LoginResponse", character, to=sid)
+
+    async def _on_AccountUpdate(self, sid, data):
+        if sid in self.accounts and "Appearance" in data:
+            self.accounts[sid]["Appearance"] = data["Appearance"]
+
+    async def _on_ChatRoomSearch(self, sid, data):
+        query = data.get("Query", "").upper()
+        result = [
+            {"Name": room.name, "MemberCount": len(room.characters)}
+            for room in self.rooms.values()
+            if query in room.name.upper()
+        ]
+        await self.sio.emit("ChatRoomSearchResult", result, to=sid)
+
+    async def _on_ChatRoomCreate(self, sid, data):
+        if data["Name"] in self.rooms:
+            await self.sio.emit("ChatRoomCreateResponse", "RoomAlreadyExist", to=sid)
+            return
+        self.rooms[data["Name"]] = FakeRoom(data)
+        await self.sio.emit("ChatRoomCreateResponse", "ChatRoomCreated", to=sid)
+        await self._enter(sid, data["Name"])
+
+    async def _on_ChatRoomJoin(self, sid, data):
+        if data["Name"] not in self.rooms:
+            await self.sio.emit("ChatRoomSearchResponse", "CannotFindRoom", to=sid)
+            return
+        await self.sio.emit("ChatRoomSearchResponse", "JoinedRoom", to=sid)
+        await self._enter(sid, data["Name"])
+
+    async def _on_ChatRoomLeave(self, sid, data):
+        await self._leave(sid, "ServerLeave")
+
+    async def _on_ChatRoomChat(self, sid, data):
+        room = self.rooms.get(self.room_of.get(sid))
+        if room and sid in self.accounts:
+            await self.broadcast_message(room.name, self.accounts[sid]["MemberNumber"],
+                                         data["Content"], data.get("Type", "Chat"))
+
+    async def _on_ChatRoomCharacterItemUpdate(self, sid, data):
+        room = self.rooms.get(self.room_of.get(sid))
+        if room:
+            await self.sio.emit("ChatRoomSyncItem", {"Source": self.accounts[sid]["MemberNumber"], "Item": data}, room=room.name)
+
+    async def _on_disconnect(self, sid, *args):
+        await self._leave(sid, "ServerDisconnect")
+        self.accounts.pop(sid, None)
+
+    # --- room helpers ---
+
+    async def _enter(self, sid, room_name):
+        room = self.rooms[room_name]
+        character = self.accounts[sid]
+        room.characters[character["MemberNumber"]] = character
+        room.sids[character["MemberNumber"]] = sid
+        self.room_of[sid] = room_name
+        await self.sio.enter_room(sid, room_name)
+        await self.sio.emit("ChatRoomSync", room.sync_payload(), to=sid)
+        await self.sio.emit(
+            "ChatRoomSyncMemberJoin",
+            {"SourceMemberNumber": character["MemberNumber"], "Character": character},
+            room=room_name,
+            skip_sid=sid,
+        )
+        await self.broadcast_message(room_name, character["MemberNumber"], "ServerEnter", "Action")
+
+    async def _leave(self, sid, action):
+        room = self.rooms.get(self.room_of.pop(sid, None))
+        if room is None or sid not in self.accounts:
+            return
+        member_number = self.accounts[sid]["MemberNumber"]
+        room.characters.pop(member_number, None)
+        room.sids.pop(member_number, None)
+        await self.sio.leave_room(sid, room.name)
+        await self.sio.emit("ChatRoomSyncMemberLeave", {"SourceMemberNumber": member_number}, room=room.name)
+        await self.broadcast_message(room.name, member_number, action, "Action")
+
+    async def broadcast_message(self, room_name, sender: int, content: str, msg_type: str = "Chat"):
+        await self.sio.emit(
+            "ChatRoomMessage",
+            {"Sender": sender, "Content": content, "Type": msg_type, "Dictionary": []},
+            room=room_name,
+        )
+
+    # --- virtual members, driven by benchmarks and tests ---
+
+    def create_room(self, settings: dict) -> FakeRoom:
+        room = self.rooms[settings["Name"]] = FakeRoom(settings)
+        return room
+
+    async def add_virtual_member(self, room_name: str, member_number: int, announce: bool = True) -> dict:
+        character = make_character(member_number)
+        self.rooms[room_name].characters[member_number] = character
+        if announce:
+            await self.sio.emit(
+                "ChatRoomSyncMemberJoin",
+                {"SourceMemberNumber": member_number, "Character": character},
+                room=room_name,
+            )
+            await self.broadcast_message(room_name, member_number, "ServerEnter", "Action")
+        return character
+
+    async def remove_virtual_member(self, room_name: str, member_number: int):
+        self.rooms[room_name].characters.pop(member_number, None)
+        await self.sio.emit("ChatRoomSyncMemberLeave", {"SourceMemberNumber": member_number}, room=room_name)
+        await self.broadcast_message(room_name, member_number, "ServerLeave", "Action")
+
+    async def sync_item(self, room_name: str, target: int, group: str, name: str = None):
+        item = {"Target": target, "Group": group}
+        if name:
+            item["Name"] = name
+        await self.sio.emit("ChatRoomSyncItem", {"Source": target, "Item": item}, room=room_name)
+
+    async def drop_all_clients(self):
+        """Disconnect every socket, e.g. to exercise reconnect logic"""
+        for sid in list(self.accounts):
+            await self.sio.disconnect(sid)
+
+
+async def _serve(host, port):
+    server = FakeBCServer(host, port)
+    await server.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
@@ -0,0 +1,101 @@
+"""Replay recorded socket traffic into a BCBotJailTimer.
+
+Inbound events from a TRAFFIC_RECORD_PATH log are fed to the bot's
+handlers at their recorded pace (--speed 1), N times faster (--speed N)
+or as fast as possible (--speed 0). Outbound emits go to a stub that
+only counts them. Reports handler throughput and latency percentiles per
+event type; for ChatRoomMessage that is the queued command handler, not
+the enqueue.
+
+    python -m bench.replay traffic.jsonl.gz --speed 0
+"""
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+
+from bench.benchmark import percentile
+from bot_jail_timer import BCBotJailTimer
+from utils.traffic_recorder import read_traffic
+
+
+class StubSio:
+    def __init__(self):
+        self.emitted = Counter()
+
+    async def emit(self, event, data=None):
+        self.emitted[event] += 1
+
+
+async def replay(path: str, speed: float) -> dict:
+    bot = BCBotJailTimer(
+        username="replay",
+        password="",
+        chatroom_settings={"Name": "replay", "Admin": [], "Ban": []},
+        timer_db_path=":memory:",
+    )
+    stub = StubSio()
+    bot.event_queue.sio = stub
+    await bot.event_queue.start()
+
+    latencies = defaultdict(list)
+    # on_ChatRoomMessage only queues the message; time the queued handler instead
+    handle_message = bot.inbound.handler
+
+    async def timed_handler(data):
+        t0 = time.perf_counter()
+        try:
+            await handle_message(data)
+        finally:
+            latencies["ChatRoomMessage"].append(time.perf_counter() - t0)
+    bot.inbound.handler = timed_handler
+
+    started = time.monotonic()
+    for record in read_traffic(path):
+        if record["dir"] != "in":
+            continue
+        handler = bot.event_handlers.get(record["event"])
+        if handler is None:
+            continue
+        if speed > 0:
+            delay = started + record["t"] / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        t0 = time.perf_counter()
+        await handler(record["data"])
+        if record["event"] != "ChatRoomMessage":
+            latencies[record["event"]].append(time.perf_counter() - t0)
+    await bot.inbound.join()
+    await bot.chat_coalescer.flush()
+    while bot.event_queue.depth:
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - started
+
+    await bot.inbound.shutdown()
+    await bot.event_queue.shutdown()
+    await bot.timer_engine.shutdown()
+    return {"elapsed": elapsed, "latencies": latencies, "emitted": stub.emitted}
+
+
+def report(result: dict):
+    latencies = result["latencies"]
+    total = sum(len(v) for v in latencies.values())
+    print(f"{total} inbound events in {result['elapsed']:.2f}s ({total / result['elapsed']:.0f} events/s)")
+    print(f"{'event':>26} | {'count':>7} | {'p50 ms':>8} | {'p90 ms':>8} | {'p99 ms':>8} | {'max ms':>8}")
+    for event, values in sorted(latencies.items(), key=lambda kv: -len(kv[1])):
+        print(
+            f"{event:>26} | {len(values):7d} | {percentile(values, 0.5) * 1000:8.3f} | "
+            f"{percentile(values, 0.9) * 1000:8.3f} | {percentile(values, 0.99) * 1000:8.3f} | "
+            f"{max(values) * 1000:8.3f}"
+        )
+    print("stubbed emits: " + ", ".join(f"{k}={v}" for k, v in result["emitted"].items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=0, help="1 = real time, N = N times faster, 0 = max speed")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    report(asyncio.run(replay(args.path, args.speed)))
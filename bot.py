@@ -1,59 +1,124 @@
 import asyncio
+import logging
+import time
 import socketio
-import json
-from lzstring import LZString
 
 from utils.socket_event_queue import SocketEventQueue
-from utils.logger import get_logger
+from utils.chat_coalescer import ChatCoalescer
+from utils.room_state import RoomMember, memory_report
+from utils.appearance import AppearanceIndex, decode_appearance_code
+from utils.response_waiter import ResponseWaiter, ResponseError
+from utils.connection_supervisor import ConnectionSupervisor, ConnectionState
+from utils.codec import get_json_codec
+from utils.inbound_pipeline import InboundPipeline
+from utils.traffic_recorder import TrafficRecorder
+from utils.metrics import Histogram, MetricsWriter, MetricsServer, format_ms
+from utils.profiler import Profiler
+from utils.logger import get_logger, log_sampler
 
 logger = get_logger(__name__)
 
+DEFAULT_SERVER_URL = "https://bondage-club-server.herokuapp.com/"
+
 
 class BCBot:
+    # ChatRoomMessage types passed on to customized_event_handler; None means all
+    MESSAGE_TYPES = None
+
     def __init__(
         self,
         username: str,
         password: str,
         chatroom_settings: dict,
         appearance_code: str = None,
+        event_queue_options: dict = None,
+        chat_coalesce_window: float = 0.3,
+        member_fields: tuple = (),
+        request_timeout: float = 30,
+        server_url: str = DEFAULT_SERVER_URL,
+        json_codec=None,
+        inbound_options: dict = None,
+        record_path: str = None,
+        metrics_port: int = None,
+        profile_dir: str = ".",
+        appearance_cache_dir: str = ".appearance_cache",
+        room_report_interval: float = 60.0,
     ):
         
         logger.info("Initializing bot...")
-        self.sio = socketio.AsyncClient()
+        self.recorder = TrafficRecorder(record_path) if record_path else None
+        self.event_handlers = {}
+        self.handler_latency = {}
+        self.metrics_server = MetricsServer(self.metrics_text, metrics_port) if metrics_port else None
+        self.profiler = Profiler(profile_dir)
+        # deep_sizeof walks every member, so scrapes reuse a recent result
+        self.room_report_interval = room_report_interval
+        self._room_report = None
+        self._room_report_at = 0.0
+        self.json_codec = json_codec or get_json_codec()
+        logger.info("Using %s for socket.io payloads", self.json_codec.name)
+        # reconnects are handled by ConnectionSupervisor
+        self.sio = socketio.AsyncClient(reconnection=False, json=self.json_codec)
         self._register_handlers()
 
-        self.event_queue = SocketEventQueue(self.sio)
+        self.event_queue = SocketEventQueue(self.sio, **(event_queue_options or {}))
+        self.event_queue.recorder = self.recorder
+        self.chat_coalescer = ChatCoalescer(self.event_queue, window=chat_coalesce_window)
+        self.inbound = InboundPipeline(self.customized_event_handler, **(inbound_options or {}))
 
         self.player = {}
         self.others = {}
-        self.appearance = json.loads(
-            LZString.decompressFromBase64(
-                appearance_code
-            )
-        ) if appearance_code else None
+        self.member_fields = tuple(member_fields)
+        self.appearance = decode_appearance_code(appearance_code, appearance_cache_dir, self.json_codec)
         self.is_logged_in = False
         self.username = username
         self.password = password
         self.chatroom_settings = chatroom_settings
         self.current_chatroom = None
         self.chatroom_search_result = None
+        self.request_timeout = request_timeout
+        self.server_url = server_url
+        self.responses = ResponseWaiter()
+        self.supervisor = None
+        self.login_queue_position = None
+        self._login_queue_seen_at = 0
+        self._joined_before = False
 
         logger.info("Bot initialized")
     
     def _register_handlers(self):
         self.sio.on("connect", self.on_connect)
         self.sio.on("disconnect", self.on_disconnect)
-        self.sio.on("LoginResponse", self.on_LoginResponse)
-        self.sio.on("ChatRoomSearchResponse", self.on_ChatRoomSearchResponse)
-        self.sio.on("ChatRoomSearchResult", self.on_ChatRoomSearchResult)
-        self.sio.on("AccountQueryResult", self.on_AccountQueryResult)
-        self.sio.on("ChatRoomMessage", self.on_ChatRoomMessage)
-        self.sio.on("ChatRoomSync", self.on_ChatRoomSync)
-        self.sio.on("ChatRoomSyncItem", self.on_ChatRoomSyncItem)
-        self.sio.on("ChatRoomSyncMemberLeave", self.on_ChatRoomSyncMemberLeave)
-        self.sio.on("ChatRoomSyncCharacter", self.on_ChatRoomSyncCharacter)
-        self.sio.on("ChatRoomSyncSingle", self.on_ChatRoomSyncSingle)
-        self.sio.on("LoginQueue", self.on_LoginQueue)
+        self._on("LoginResponse", self.on_LoginResponse)
+        self._on("ChatRoomSearchResponse", self.on_ChatRoomSearchResponse)
+        self._on("ChatRoomCreateResponse", self.on_ChatRoomCreateResponse)
+        self._on("ChatRoomSearchResult", self.on_ChatRoomSearchResult)
+        self._on("AccountQueryResult", self.on_AccountQueryResult)
+        self._on("ChatRoomMessage", self.on_ChatRoomMessage)
+        self._on("ChatRoomSync", self.on_ChatRoomSync)
+        self._on("ChatRoomSyncItem", self.on_ChatRoomSyncItem)
+        self._on("ChatRoomSyncMemberJoin", self.on_ChatRoomSyncMemberJoin)
+        self._on("ChatRoomSyncMemberLeave", self.on_ChatRoomSyncMemberLeave)
+        self._on("ChatRoomSyncCharacter", self.on_ChatRoomSyncCharacter)
+        self._on("ChatRoomSyncSingle", self.on_ChatRoomSyncSingle)
+        self._on("LoginQueue", self.on_LoginQueue)
+
+    def _on(self, event: str, handler):
+        """Register a server event handler, timed into handler_latency and
+        recorded when recording is on"""
+        latency = self.handler_latency[event] = Histogram()
+
+        async def _handler(data=None):
+            if self.recorder is not None:
+                self.recorder.record("in", event, data)
+            started = time.perf_counter()
+            try:
+                await handler(data)
+            finally:
+                latency.observe(time.perf_counter() - started)
+
+        self.event_handlers[event] = _handler
+        self.sio.on(event, _handler)
     
     async def connect(self, url, **kwargs):
         try:
@@ -76,71 +141,109 @@ class BCBot:
         logger.info("Socket disconnected")
         self.is_logged_in = False
         self.current_chatroom = None
+        self.responses.reject_all(ResponseError("Socket disconnected"))
 
     async def on_LoginResponse(self, data):
         logger.info("on_LoginResponse received.")
-        logger.debug(f"on_LoginResponsedata: {data}")
+        logger.debug("on_LoginResponsedata: %s", data)
 
+        if not isinstance(data, dict):
+            # e.g. "InvalidNamePassword"
+            self.responses.reject("LoginResponse", ResponseError(f"Login failed: {data}"))
+            return
         self.player = data
         self.is_logged_in = True
+        self.responses.resolve("LoginResponse", data)
     
     async def on_ChatRoomSearchResponse(self, data):
-        logger.info(f"on_ChatRoomSearchResponse data: {data}")
+        logger.info("on_ChatRoomSearchResponse data: %s", data)
+
+        # answer to ChatRoomJoin; on success ChatRoomSync follows
+        if data != "JoinedRoom":
+            self.responses.reject("ChatRoomSync", ResponseError(f"Failed to join chatroom: {data}"))
+
+    async def on_ChatRoomCreateResponse(self, data):
+        logger.info("on_ChatRoomCreateResponse data: %s", data)
+
+        if data != "ChatRoomCreated":
+            self.responses.reject("ChatRoomSync", ResponseError(f"Failed to create chatroom: {data}"))
 
     async def on_AccountQueryResult(self, data):
-        logger.info(f"on_AccountQueryResult data: {data}")
+        logger.info("on_AccountQueryResult data: %s", data)
+
+    def wants_message(self, data) -> bool:
+        """Cheap filter run before any logging or queueing of a ChatRoomMessage"""
+        return self.MESSAGE_TYPES is None or data.get("Type") in self.MESSAGE_TYPES
 
     async def on_ChatRoomMessage(self, data):
-        logger.info(f"on_ChatRoomMessage data received. Type: {data['Type']}, Player: {data['Sender']}, Content: {data['Content']}")
+        if not self.wants_message(data):
+            self.inbound.stats["filtered"] += 1
+            return
+        if logger.isEnabledFor(logging.INFO) and log_sampler.allow("ChatRoomMessage"):
+            logger.info(
+                "on_ChatRoomMessage data received. Type: %s, Player: %s, Content: %s",
+                data["Type"], data["Sender"], data["Content"],
+            )
 
-        await self.customized_event_handler(data)
+        self.inbound.submit(data.get("Sender"), data)
 
     async def on_ChatRoomSync(self, data):
-        logger.info(f"on_ChatRoomSync data received.")
-        logger.debug(f"on_ChatRoomSync data: {data}")
+        logger.info("on_ChatRoomSync data received.")
+        logger.debug("on_ChatRoomSync data: %s", data)
         self.current_chatroom = {
             k: v for k, v in data.items() if k not in ["Character", "Space"]
         }
-        logger.info(f"Entered room {data['Name']}, {len(data['Character'])} members in total")
+        self.current_chatroom["Admin"] = set(data.get("Admin", []))
+        self.current_chatroom["Ban"] = set(data.get("Ban", []))
+        self._joined_before = True
+        # a full sync lists every member, so drop anyone we still remember
+        self.others = {}
+        logger.info("Entered room %s, %s members in total", data["Name"], len(data["Character"]))
 
         await self.on_ChatRoomSyncCharacter(data)
+        await self.reconcile_members()
+        self.responses.resolve("ChatRoomSync", self.current_chatroom)
 
     async def on_ChatRoomSyncItem(self, data):
-        logger.info(f"on_ChatRoomSyncItem data received.")
-        logger.debug(f"on_ChatRoomSyncItem data: {data}")
+        if logger.isEnabledFor(logging.INFO) and log_sampler.allow("ChatRoomSyncItem"):
+            logger.info("on_ChatRoomSyncItem data received.")
+        logger.debug("on_ChatRoomSyncItem data: %s", data)
 
         item = data["Item"]
         if not self.others.get(item["Target"]):
             logger.warning(
-                f"try to update an item on character {item['Target']} but the data is not in database"
+                "try to update an item on character %s but the data is not in database", item["Target"]
             )
             return
         # update character data
-        appearance = self.others[item["Target"]]["Appearance"]
-        for i in range(len(appearance)):
-            if appearance[i]["Group"] == item["Group"]:
-                if item.get("Name"):  # change an item
-                    appearance[i] = item
-                else:  # remove an item
-                    appearance = appearance[:i] + appearance[i + 1 :]
-                return
-        appearance.append(item)  # add a new item
+        self.others[item["Target"]].appearance.apply(item)
+
+    async def on_ChatRoomSyncMemberJoin(self, data):
+        logger.debug("on_ChatRoomSyncMemberJoin data: %s", data)
+
+        await self.on_ChatRoomSyncCharacter(data)
+        logger.info("Player joined: %s", data["SourceMemberNumber"])
+        await self.reconcile_members()
 
     async def on_ChatRoomSyncMemberLeave(self, data):
-        logger.info(f"on_ChatRoomSyncMemberLeave data: {data}")
+        logger.debug("on_ChatRoomSyncMemberLeave data: %s", data)
 
         self.others.pop(data["SourceMemberNumber"], None)
-        logger.info(f'Player left: {data["SourceMemberNumber"]}')
+        logger.info("Player left: %s", data["SourceMemberNumber"])
+        await self.reconcile_members()
 
     async def on_ChatRoomSearchResult(self, data):
-        logger.info(f"on_ChatRoomSearchResult data received.")
-        logger.debug(f"on_ChatRoomSearchResult data: {data}")
+        logger.info("on_ChatRoomSearchResult data received.")
+        logger.debug("on_ChatRoomSearchResult data: %s", data)
 
         self.chatroom_search_result = data
+        self.responses.resolve("ChatRoomSearchResult", data)
 
     async def on_ChatRoomSyncCharacter(self, data):
-        logger.info(f"on_ChatRoomSyncCharacter data received.")
-        logger.debug(f"on_ChatRoomSyncCharacter data: {data}")
+        log_members = logger.isEnabledFor(logging.INFO) and log_sampler.allow("ChatRoomSyncCharacter")
+        if log_members:
+            logger.info("on_ChatRoomSyncCharacter data received.")
+        logger.debug("on_ChatRoomSyncCharacter data: %s", data)
 
         Characters = (
             data["Character"]
@@ -148,12 +251,13 @@ class BCBot:
             else [data["Character"]]
         )
         for i in Characters:
-            logger.info(f"Update {i['Name']}({i['MemberNumber']})'s data")
-            self.others[i["MemberNumber"]] = i
+            if log_members:
+                logger.info("Update %s(%s)'s data", i["Name"], i["MemberNumber"])
+            member = RoomMember.from_payload(i, self.member_fields)
+            self.others[member.member_number] = member
 
             # update ownership
-            owner = i.get("Ownership", {})
-            owner = owner.get("MemberNumber", 0) if owner else 0
+            owner = member.owner
             if (
                 owner != 0
                 and owner == self.player["MemberNumber"]
@@ -178,19 +282,43 @@ class BCBot:
             #             {"OnlineSharedSettings": self.player["OnlineSharedSettings"]}
             #         )
 
+    def room_memory_report(self, max_age: float = None) -> dict:
+        """Member count and room-state bytes. The byte count is measured at
+        most every `max_age` seconds (room_report_interval by default, 0
+        forces a fresh walk); the member count is always current."""
+        if max_age is None:
+            max_age = self.room_report_interval
+        now = time.monotonic()
+        if self._room_report is None or now - self._room_report_at >= max_age:
+            self._room_report = memory_report(self.others)
+            self._room_report_at = now
+        return {**self._room_report, "members": len(self.others)}
+
     async def on_ChatRoomSyncSingle(self, data):
-        logger.info(f"on_ChatRoomSyncSingle data received.")
-        logger.debug(f"on_ChatRoomSyncSingle data: {data}")
+        if logger.isEnabledFor(logging.INFO) and log_sampler.allow("ChatRoomSyncSingle"):
+            logger.info("on_ChatRoomSyncSingle data received.")
+        logger.debug("on_ChatRoomSyncSingle data: %s", data)
 
         await self.on_ChatRoomSyncCharacter(data)
 
     async def on_LoginQueue(self, data):
-        logger.info(f"on_LoginQueue data: {data}")
-        await asyncio.sleep(30)
+        logger.info("on_LoginQueue data: %s", data)
+        self.login_queue_position = data
+        self._login_queue_seen_at = time.monotonic()
+        if self.supervisor:
+            self.supervisor.set_state(ConnectionState.LOGIN_QUEUED)
+
 
+    async def _request(self, event_name: str, data: dict, response: str):
+        """Emit a request and wait for the event that answers it"""
+        future = self.responses.expect(response)
+        await self.event_queue.put_event(event_name, data)
+        return await self.responses.wait(response, future, self.request_timeout)
 
     async def login(self):
-        logger.info(f"Logging in using AccountName {self.username}.")
+        logger.info("Logging in using AccountName %s.", self.username)
+        self.login_queue_position = None
+        future = self.responses.expect("LoginResponse")
         await self.event_queue.put_event(
             "AccountLogin", 
             {
@@ -198,9 +326,18 @@ class BCBot:
                 "Password": self.password
             }
         )
+        # keep waiting as long as the server reports our place in the login queue
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.request_timeout)
+            except asyncio.TimeoutError:
+                if time.monotonic() - self._login_queue_seen_at > self.request_timeout:
+                    future.cancel()
+                    raise
+                logger.info("Waiting in login queue, position %s", self.login_queue_position)
 
     async def search_chatroom(self, name, **kwargs):
-        logger.info(f"Searching for chatroom {name}.")
+        logger.info("Searching for chatroom %s.", name)
         data = {
             "Query": name.upper(),
             "Language": "",
@@ -210,36 +347,127 @@ class BCBot:
             "ShowLocked": True,
         }
         data.update(kwargs)
-        await self.event_queue.put_event("ChatRoomSearch", data)
+        return await self._request("ChatRoomSearch", data, "ChatRoomSearchResult")
 
     async def create_chatroom(self, chatroom_settings: dict):
-        data = chatroom_settings
-        data["Admin"].append(self.player["MemberNumber"])
-        logger.info(f'Creating chatroom {data["Name"]}.')
-        logger.debug(f"Chatroom data: {data}")
-        await self.event_queue.put_event("ChatRoomCreate", data)
+        data = dict(chatroom_settings)
+        data["Admin"] = list(chatroom_settings["Admin"]) + [self.player["MemberNumber"]]
+        logger.info("Creating chatroom %s.", data["Name"])
+        logger.debug("Chatroom data: %s", data)
+        return await self._request("ChatRoomCreate", data, "ChatRoomSync")
     
     async def join_chatroom(self, name):
         data = {"Name": name}
-        logger.info(f"Joining chatroom {name}.")
-        await self.event_queue.put_event("ChatRoomJoin", data)
+        logger.info("Joining chatroom %s.", name)
+        return await self._request("ChatRoomJoin", data, "ChatRoomSync")
+
+    async def enter_chatroom(self):
+        """Join the configured chatroom, creating it if it doesn't exist"""
+        name = self.chatroom_settings["Name"]
+        if self._joined_before:
+            # rejoining after a reconnect, the room most likely still exists
+            try:
+                await self.join_chatroom(name)
+                await self.reset_appearance()
+                return
+            except ResponseError as e:
+                logger.info("Direct rejoin failed (%s), searching instead", e)
+        if await self.search_chatroom(name):
+            await self.join_chatroom(name)
+        else:
+            await self.create_chatroom(self.chatroom_settings)
+        await self.reset_appearance()
+
+    def current_appearance(self) -> list:
+        """The bot's appearance as the server last reported it: room sync data, else LoginResponse"""
+        me = self.others.get(self.player.get("MemberNumber"))
+        if me is not None:
+            return me.appearance.to_list()
+        return self.player.get("Appearance")
 
     async def reset_appearance(self):
         logger.info("Resetting appearance...")
         if not self.appearance:
             logger.warning("No appearance data found. Skipping...")
             return
+        current = self.current_appearance()
+        if current is not None and AppearanceIndex(current).matches(self.appearance):
+            logger.info("Appearance unchanged, skipping AccountUpdate")
+            return
         data = {
             "AssetFamily": "Female3DCG",
             "Appearance": self.appearance,
             "ItemPermission": 1,
         }
         await self.event_queue.put_event("AccountUpdate", data)
+        self.player["Appearance"] = self.appearance
+        me = self.others.get(self.player.get("MemberNumber"))
+        if me is not None:
+            me.appearance = AppearanceIndex(self.appearance)
+    
+    async def reconcile_state(self):
+        """Called after every (re)join, once the room's member list is synced"""
+        pass
+
+    async def reconcile_members(self):
+        """Called after a full ChatRoomSync and after a member leaves, with `others` up to date"""
+        pass
+
+    @property
+    def connection_metrics(self) -> dict:
+        return dict(self.supervisor.metrics) if self.supervisor else {}
+
+    def write_metrics(self, out: MetricsWriter):
+        """Add this bot's metrics to a Prometheus exposition; subclasses extend it"""
+        for event, latency in self.handler_latency.items():
+            out.histogram("handler_seconds", "Time spent in on_* handlers", latency, event=event)
+        # on_ChatRoomMessage only queues the message, the commands run here
+        out.histogram(
+            "inbound_handler_seconds", "Time spent handling each queued chat message", self.inbound.handler_histogram
+        )
+        queue = self.event_queue
+        out.gauge("event_queue_depth", "Outbound events waiting to be sent", queue.depth)
+        out.histogram("event_queue_wait_seconds", "Outbound enqueue-to-emit delay", queue.wait_histogram)
+        out.counter("event_queue_sent_total", "Outbound events sent", queue.stats["sent"])
+        out.counter("event_queue_dropped_total", "Outbound events dropped on overflow", queue.stats["dropped"])
+        out.gauge("inbound_pending", "Inbound chat messages waiting for a handler", self.inbound.pending)
+        out.counter("inbound_dropped_total", "Inbound chat messages dropped on overflow", self.inbound.stats["dropped"])
+        connection = self.connection_metrics
+        out.counter("reconnects_total", "Sessions re-established after a disconnect", connection.get("reconnects", 0))
+        out.counter("failed_connects_total", "Failed connect/login/join attempts", connection.get("failed_attempts", 0))
+        out.gauge("in_room", "1 while the bot is in its chatroom", int(self.current_chatroom is not None))
+        room = self.room_memory_report()
+        out.gauge("room_members", "Members tracked in the room-state model", room["members"])
+        out.gauge(
+            "room_state_bytes",
+            "Approximate memory held by the room-state model, re-measured every room_report_interval",
+            room["bytes"],
+        )
+
+    def metrics_text(self) -> str:
+        out = MetricsWriter()
+        self.write_metrics(out)
+        return out.text()
+
+    def status_lines(self) -> list:
+        """Compact human-readable summary of write_metrics, for chat"""
+        latencies = {**self.handler_latency, "ChatRoomMessage": self.inbound.handler_histogram}
+        slowest = max(
+            ((latency.quantile(0.99), event) for event, latency in latencies.items() if latency.count),
+            default=None,
+        )
+        room = self.room_memory_report()
+        connection = self.connection_metrics
+        return [
+            f"发送队列 {self.event_queue.depth}，等待 p99 {format_ms(self.event_queue.wait_histogram.quantile(0.99))}",
+            f"最慢处理 {slowest[1]} p99 {format_ms(slowest[0])}" if slowest else "最慢处理 -",
+            f"重连 {connection.get('reconnects', 0)} 次，成员 {room['members']}（{room['bytes'] // 1024}KB）",
+        ]
     
     async def send_to_chat(self, msg):
-        logger.info(f"Sending message: {msg}")
-        data = {"Content": msg, "Type": "Chat", "Target": None}
-        await self.event_queue.put_event("ChatRoomChat", data)
+        if logger.isEnabledFor(logging.INFO) and log_sampler.allow("send_to_chat"):
+            logger.info("Sending message: %s", msg)
+        await self.chat_coalescer.add(msg)
 
     async def customized_event_handler(self, data):
         logger.warning("No customized event handler found.")
@@ -249,42 +477,34 @@ class BCBot:
         try:
             logger.info("Starting event queue...")
             await self.event_queue.start()
-
-            
-            await self.connect(
-                "https://bondage-club-server.herokuapp.com/",
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; rv:102.0) Gecko/20100101 Firefox/102.0",
-                    "Origin": "https://www.bondage-europe.com",
+            if self.metrics_server:
+                await self.metrics_server.start()
+
+            self.supervisor = ConnectionSupervisor(
+                self,
+                self.server_url,
+                connect_kwargs={
+                    "headers": {
+                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; rv:102.0) Gecko/20100101 Firefox/102.0",
+                        "Origin": "https://www.bondage-europe.com",
+                    },
                 },
             )
-            await self.login()
-            while True:
-                if not self.is_logged_in:
-                    await self.login()
-                elif not self.current_chatroom:
-                    await self.search_chatroom(self.chatroom_settings["Name"])
-                    while self.chatroom_search_result == None:
-                        await asyncio.sleep(0.5)
-                    if self.chatroom_search_result:
-                        await self.join_chatroom(self.chatroom_settings["Name"])
-                    else:
-                        await self.create_chatroom(self.chatroom_settings)
-                    await asyncio.sleep(1)
-                    await self.reset_appearance()
-                else:
-                    logger.info(
-                        "Idling..."
-                    )
-                    await self.sio.wait()
-                await asyncio.sleep(3)
-                
-
+            await self.supervisor.run()
 
         except (KeyboardInterrupt, asyncio.CancelledError):
             logger.info("Shutting down with Ctrl+C...")
+            # the caller cancelled us, let it see that once cleanup is done
+            raise
         except Exception as e:
             logger.error(e)
         
         finally:
+            await self.profiler.stop()
             await self.disconnect()
+            await self.inbound.shutdown()
+            await self.event_queue.shutdown()
+            if self.metrics_server:
+                await self.metrics_server.close()
+            if self.recorder:
+                self.recorder.close()
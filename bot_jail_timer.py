@@ -1,38 +1,242 @@
+import functools
+import os
+
 from bot import BCBot
 from utils.jail_timer import JailTimer
+from utils.timer_engine import TimerEngine
+from utils.clock import Clock
+from utils.timer_store import TimerStore
+from utils.commands import CommandTable, CommandError, player_id, duration, duration_seconds, optional
 from utils.logger import get_logger
+from utils.metrics import format_ms
 
 logger = get_logger(__name__)
 
+PRESENCE_ACTIONS = frozenset(("ServerEnter", "ServerLeave", "ServerDisconnect"))
+
+
+def _format_duration(seconds: int) -> str:
+    """1天, 1小时, 1天12小时, 30分钟 ..."""
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, seconds = divmod(rest, 60)
+    parts = [(days, "天"), (hours, "小时"), (minutes, "分钟"), (seconds, "秒")]
+    return "".join(f"{n}{unit}" for n, unit in parts if n) or "0秒"
+
+
+def _format_remaining(seconds: int) -> str:
+    """Compact remaining time for the jail board: 2天03:15 or 00:45:10"""
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if days:
+        return f"{days}天{hours:02}:{minutes:02}"
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def _id_list(ids: list, limit: int = 10) -> str:
+    shown = "、".join(str(i) for i in ids[:limit])
+    return shown if len(ids) <= limit else f"{shown} 等 {len(ids)} 人"
+
 
 class BCBotJailTimer(BCBot):
-    def __init__(self, *args, **kwargs):
+    MESSAGE_TYPES = frozenset(("Chat", "Action"))
+
+    def __init__(
+        self,
+        *args,
+        timer_db_path: str = "jail_timers.db",
+        clock: Clock = None,
+        timer_engine: TimerEngine = None,
+        timer_flush_interval: float = 5.0,
+        alert_thresholds: tuple = (86400, 3600),
+        board_interval: float = 0,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
     
         self.silent = False
+        # several bots in one process can share an engine (see BotSupervisor)
+        self._owns_engine = timer_engine is None
+        self.timer_engine = TimerEngine(clock) if timer_engine is None else timer_engine
+        self.clock = self.timer_engine.clock
+        self.timer_store = TimerStore(timer_db_path, flush_interval=timer_flush_interval, clock=self.clock)
         self.timer_list = {}
+        self._timers_to_resume = set()
+        # alert when a running sentence crosses one of these remaining times (seconds)
+        self.alert_thresholds = tuple(sorted(alert_thresholds, reverse=True))
+        # post the jail board every this many seconds (0 = only on N 名单)
+        self.board_interval = board_interval
+        self._load_timers()
+
+        self.commands = CommandTable(prefix="N", on_error=self.send_to_chat)
+        self._register_commands()
+
+    def _register_commands(self):
+        register = self.commands.register
+        register("安静", self._cmd_silent)
+        register("取消安静", self._cmd_unsilent)
+        register("笑", self._cmd_laugh)
+        register("审判", self._cmd_sentence, player_id, duration,
+                 usage="N 审判 {玩家编号} {天数}天")
+        register("时间", self.update_time, player_id, optional(duration),
+                 usage="N 时间 {玩家编号} (+/-{天数}天)")
+        register("暂停", self._cmd_pause, player_id, usage="N 暂停 {玩家编号}")
+        register("继续", self._cmd_resume, player_id, usage="N 继续 {玩家编号}")
+        register("名单", self._cmd_board)
+        register("状态", self._cmd_status)
+        register("分析", self._cmd_profile, optional(duration_seconds), usage="N 分析 (秒数或时长，如 60 或 5分钟)")
+        register("停止分析", self._cmd_stop_profile)
+
+    def _new_timer(self, playerid: int) -> JailTimer:
+        return JailTimer(
+            on_finish_handler=self._on_finish,
+            engine=self.timer_engine,
+            id=playerid,
+        )
+
+    def _load_timers(self):
+        """Rebuild timers from the store, paused until the room is joined"""
+        for playerid, state in self.timer_store.load_all().items():
+            timer = self._new_timer(playerid)
+            timer.restore(state)
+            self.timer_list[playerid] = timer
+            if state["running"]:
+                self._timers_to_resume.add(playerid)
+
+    def reload_timers(self):
+        """Replace the (not yet started) timers with the store's current state"""
+        self.timer_list = {}
+        self._timers_to_resume = set()
+        self._load_timers()
+
+    def _timer_changed(self, playerid: int):
+        """Persist a timer and re-plan its alerts; called after every change"""
+        timer = self.timer_list.get(playerid)
+        if timer is not None:
+            self.timer_store.save(playerid, timer.snapshot())
+        else:
+            self.timer_store.delete(playerid)
+        self._schedule_alerts(playerid, timer)
+
+    def _schedule_alerts(self, playerid: int, timer: JailTimer = None):
+        """Put one engine entry per threshold the running timer has yet to cross"""
+        for threshold in self.alert_thresholds:
+            key = (self, "alert", playerid, threshold)
+            if timer is not None and timer._running and timer.remaining_seconds > threshold:
+                self.timer_engine.schedule(
+                    key, timer._deadline - threshold, functools.partial(self._alert, playerid, threshold)
+                )
+            else:
+                self.timer_engine.cancel(key)
+
+    async def _alert(self, playerid: int, threshold: int):
+        if playerid in self.timer_list:
+            await self.send_to_chat(f"玩家 {playerid} 的剩余时间已不足 {_format_duration(threshold)}")
+
+    def board_lines(self) -> list:
+        """One line per sentenced player, least time left first"""
+        entries = sorted(
+            (timer.remaining_seconds, playerid, timer._running)
+            for playerid, timer in self.timer_list.items()
+        )
+        return [f"名单（{len(entries)} 人）："] + [
+            f"{playerid} {_format_remaining(remaining)}" + ("" if running else " 暂停")
+            for remaining, playerid, running in entries
+        ]
+
+    async def post_board(self):
+        if not self.timer_list:
+            await self.send_to_chat("没有被审判的玩家")
+            return
+        await self.send_to_chat("\n".join(self.board_lines()))
+
+    def _schedule_board(self):
+        self.timer_engine.schedule((self, "board"), self.timer_engine.now() + self.board_interval, self._periodic_board)
+
+    async def _periodic_board(self):
+        self._schedule_board()
+        if self.timer_list and self.current_chatroom is not None:
+            await self.post_board()
     
     async def _on_finish(self, id: str):
-        logger.info(f"Player {id}'s timer has ended.")
+        logger.info("Player %s's timer has ended.", id)
         self.timer_list.pop(id)
+        self._timer_changed(id)
         await self.send_to_chat(f"玩家 {id} 的计时结束")
+
+    async def reconcile_state(self):
+        # timers that were running when the bot went down and ran out meanwhile fire right away;
+        # the rest were already resumed or left paused by reconcile_members
+        resume, self._timers_to_resume = self._timers_to_resume, set()
+        for playerid in resume:
+            timer = self.timer_list.get(playerid)
+            if timer is not None and not timer._running and timer.remaining_seconds <= 0:
+                await timer.start()
+        await self.reconcile_members()
+        # the store still has these running with a wall deadline; their players are away, so store them paused
+        for playerid in resume:
+            timer = self.timer_list.get(playerid)
+            if timer is not None and not timer._running:
+                self._timer_changed(playerid)
+
+    async def reconcile_members(self):
+        """Resume timers of present players and pause those of absent ones.
+
+        One pass over `timer_list` with O(1) lookups in `others`, so a full
+        room sync costs O(members + timers); the store writes are batched by
+        its next flush and the changes are reported in one chat message. A
+        single change (one player joining or leaving) gets the usual per-player
+        message with the remaining time instead.
+        """
+        present = self.others
+        resumed, paused = [], []
+        for playerid, timer in self.timer_list.items():
+            if playerid in present:
+                if not timer._running:
+                    resumed.append(playerid)
+            elif timer._running and timer.remaining_seconds > 0:
+                paused.append(playerid)
+        if not resumed and not paused:
+            return
+        if len(resumed) + len(paused) == 1:
+            if resumed:
+                await self.start_timer(resumed[0])
+            else:
+                await self.pause_timer(paused[0])
+            return
+
+        for playerid in resumed:
+            await self.timer_list[playerid].start()
+            self._timer_changed(playerid)
+        for playerid in paused:
+            await self.timer_list[playerid].pause()
+            self._timer_changed(playerid)
+        logger.info("Reconciled timers with room members: %s resumed, %s paused", len(resumed), len(paused))
+        parts = []
+        if resumed:
+            parts.append(f"继续 {_id_list(resumed)}")
+        if paused:
+            parts.append(f"暂停 {_id_list(paused)}")
+        await self.send_to_chat("成员同步，计时器" + "；".join(parts))
     
-    async def sentence(self, playerid: int, days: int):
+    async def sentence(self, playerid: int, seconds: int):
         if playerid in self.others:
-            self.timer_list[playerid] = JailTimer(
-                on_finish_handler=self._on_finish,
-                id=playerid,
-            )
-            await self.timer_list[playerid].add_time(days=days)
+            if playerid in self.timer_list:
+                await self.timer_list[playerid].pause()
+            self.timer_list[playerid] = self._new_timer(playerid)
+            await self.timer_list[playerid].add_time(seconds=seconds)
             await self.timer_list[playerid].start()
+            self._timer_changed(playerid)
             await self.send_to_chat(f"玩家 {playerid} 已被审判：{await self.timer_list[playerid].get_remaining_time()}")
         else:
             await self.send_to_chat(f"玩家 {playerid} 不在房间中")
     
-    async def update_time(self, playerid: int, update_days: int = None):
+    async def update_time(self, playerid: int, update_seconds: int = None):
         if playerid in self.timer_list:
-            if update_days != None:
-                await self.timer_list[playerid].add_time(days=update_days)
+            if update_seconds != None:
+                await self.timer_list[playerid].add_time(seconds=update_seconds)
+                self._timer_changed(playerid)
             await self.send_to_chat(f"玩家 {playerid} 的剩余时间为：{await self.timer_list[playerid].get_remaining_time()}")
         else:
             await self.send_to_chat(f"玩家 {playerid} 没有被审判")
@@ -40,6 +244,7 @@ class BCBotJailTimer(BCBot):
     async def start_timer(self, playerid: int):
         if playerid in self.timer_list:
             await self.timer_list[playerid].start()
+            self._timer_changed(playerid)
             await self.send_to_chat(f"玩家 {playerid} 计时器继续，剩余时间为：{await self.timer_list[playerid].get_remaining_time()}")
         else:
             await self.send_to_chat(f"玩家 {playerid} 没有被审判")
@@ -47,65 +252,119 @@ class BCBotJailTimer(BCBot):
     async def pause_timer(self, playerid: int):
         if playerid in self.timer_list:
             await self.timer_list[playerid].pause()
+            self._timer_changed(playerid)
             await self.send_to_chat(f"玩家 {playerid} 计时器暂停，剩余时间为：{await self.timer_list[playerid].get_remaining_time()}")
         else:
             await self.send_to_chat(f"玩家 {playerid} 没有被审判")
 
+    async def run(self):
+        await self.timer_store.start()
+        if self.board_interval > 0:
+            self._schedule_board()
+        try:
+            await super().run()
+        finally:
+            self.timer_engine.cancel((self, "board"))
+            for playerid, timer in self.timer_list.items():
+                self.timer_engine.cancel(timer)
+                self._schedule_alerts(playerid)
+            if self._owns_engine:
+                await self.timer_engine.shutdown()
+            await self.timer_store.close()
+
+    def _timer_counts(self):
+        running = sum(1 for timer in self.timer_list.values() if timer._running)
+        return running, len(self.timer_list) - running
+
+    def write_metrics(self, out):
+        super().write_metrics(out)
+        running, paused = self._timer_counts()
+        out.gauge("timers", "Jail timers by state", running, state="running")
+        out.gauge("timers", "Jail timers by state", paused, state="paused")
+        out.histogram("timer_lateness_seconds", "Delay between a timer deadline and its callback",
+                      self.timer_engine.lateness)
 
+    def status_lines(self) -> list:
+        running, paused = self._timer_counts()
+        return super().status_lines() + [
+            f"计时 {running} 运行 / {paused} 暂停，到期延迟 p99 {format_ms(self.timer_engine.lateness.quantile(0.99))}",
+        ]
+
+    def wants_message(self, data) -> bool:
+        if data.get("Type") == "Chat":
+            return self.commands.matches(data.get("Content", ""))
+        return data.get("Type") == "Action" and data.get("Content") in PRESENCE_ACTIONS
+
+    async def _cmd_silent(self):
+        self.silent = True
+
+    async def _cmd_unsilent(self):
+        self.silent = False
+
+    async def _cmd_laugh(self):
+        await self.send_to_chat("哈哈哈哈鱼鱼是笨蛋")
+
+    async def _cmd_board(self):
+        await self.post_board()
+
+    async def _cmd_status(self):
+        await self.send_to_chat("\n".join(self.status_lines()))
+
+    async def _cmd_profile(self, seconds: int = 60):
+        if seconds <= 0:
+            raise CommandError("分析时长必须大于 0")
+        if self.profiler.running:
+            raise CommandError("分析已在进行中，发送 N 停止分析 提前结束")
+        self.profiler.start(seconds, on_finish=self._report_profile)
+        await self.send_to_chat(f"开始分析，最长 {min(seconds, self.profiler.max_window):.0f} 秒")
+
+    async def _cmd_stop_profile(self):
+        if not self.profiler.running:
+            raise CommandError("当前没有进行中的分析")
+        await self.profiler.stop()
+
+    async def _report_profile(self, result: dict):
+        top = "，".join(f"{leaf} {n / result['samples']:.0%}" for leaf, n in result["top"][:3])
+        await self.send_to_chat(
+            f"分析结束（{result['elapsed']:.0f} 秒，{result['samples']} 次采样）："
+            f"循环繁忙 {result['busy_ratio']:.0%}（调试开销 {result['debug_overhead_ratio']:.0%}），慢回调 {result['slow_callbacks']} 个，"
+            f"任务 {result['tasks']} 个"
+            + (f"\n最忙：{top}" if top else "")
+            + f"\n详见 {os.path.basename(result['path'])}"
+        )
+
+    async def _cmd_sentence(self, playerid: int, seconds: int):
+        if seconds <= 0:
+            raise CommandError("审判时间必须大于 0")
+        await self.sentence(playerid, seconds)
+
+    async def _cmd_pause(self, playerid: int):
+        timer = self.timer_list.get(playerid)
+        if timer is None or timer._running:
+            await self.pause_timer(playerid)
+
+    async def _cmd_resume(self, playerid: int):
+        timer = self.timer_list.get(playerid)
+        if timer is None or not timer._running:
+            await self.start_timer(playerid)
 
     async def customized_event_handler(self, data):
-        logger.info(f"Starting customized event handler...")
+        logger.debug("Starting customized event handler...")
 
         if data["Type"] == "Chat" \
                 and data["Sender"] != self.player["MemberNumber"] \
                 and data["Sender"] in self.current_chatroom["Admin"]:
+            await self.commands.dispatch(data["Content"])
 
-            message = data["Content"]
-            if message == "N 安静":
-                self.silent = True
-                return
-            elif message == "N 取消安静":
-                self.silent = False
-                return
-            elif message == "N 笑":
-                await self.send_to_chat("哈哈哈哈鱼鱼是笨蛋")
-
-            # Sentence to jail (N 审判 {playerid} {days}天)
-            elif message.startswith("N 审判"):
-                message.split()
-                playerid = int(message.split()[2])
-                days = int(message.split()[3].strip("天"))
-                
-                await self.sentence(playerid, days)
-            
-            # Check/update time (N 时间 {playerid} (+/-{days}天))
-            elif message.startswith("N 时间"):
-                playerid = int(message.split()[2])
-
-                if len(message.split()) == 4:
-                    await self.update_time(playerid, int(message.split()[3].strip("天")))
-                else:
-                    await self.update_time(playerid)
-            
-            # Pause time (N 暂停 {playerid})
-            elif message.startswith("N 暂停"):
-                playerid = int(message.split()[2])
-                if self.timer_list[playerid]._running == True:
-                    await self.pause_timer(playerid)
-
-            # Pause time (N 继续 {playerid})
-            elif message.startswith("N 继续"):
-                playerid = int(message.split()[2])
-                if self.timer_list[playerid]._running == False:
-                    await self.start_timer(playerid)
-            
-
+        # a ChatRoomSync/MemberLeave reconciliation may already have handled the change
         if data["Type"] == "Action" \
                 and data["Content"] == "ServerEnter" \
-                and data["Sender"] in self.timer_list:
+                and data["Sender"] in self.timer_list \
+                and not self.timer_list[data["Sender"]]._running:
             await self.start_timer(data["Sender"])
         
         if data["Type"] == "Action" \
                 and data["Content"] in ["ServerLeave", "ServerDisconnect"] \
-                and data["Sender"] in self.timer_list:
-            await self.pause_timer(data["Sender"])
\ No newline at end of file
+                and data["Sender"] in self.timer_list \
+                and self.timer_list[data["Sender"]]._running:
+            await self.pause_timer(data["Sender"])
@@ -5,15 +5,62 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from bot_jail_timer import BCBotJailTimer
+from utils.logger import enable_queue_logging, get_logger
+from utils.codec import get_json_codec
+from utils.commands import duration
+from utils.hot_standby import HotStandby
+from utils.lease import Lease
+
+if os.getenv("LOG_QUEUE", "0") == "1":
+    enable_queue_logging()
 
 with open('chatroom_config.json', 'r') as f:
     chatroom_config = json.load(f)
 
-bot_test = BCBotJailTimer(
-    username=os.getenv("BC_USERNAME", ""),
-    password=os.getenv("BC_PASSWORD", ""),
-    chatroom_settings=chatroom_config,
-    appearance_code=os.getenv("APPEARANCE_CODE", ""),
-)
 
-asyncio.run(bot_test.run())
\ No newline at end of file
+def make_bot():
+    return BCBotJailTimer(
+        username=os.getenv("BC_USERNAME", ""),
+        password=os.getenv("BC_PASSWORD", ""),
+        chatroom_settings=chatroom_config,
+        appearance_code=os.getenv("APPEARANCE_CODE", ""),
+        appearance_cache_dir=os.getenv("APPEARANCE_CACHE_DIR", ".appearance_cache"),
+        timer_db_path=os.getenv("TIMER_DB_PATH", "jail_timers.db"),
+        event_queue_options={
+            "mode": os.getenv("EVENT_QUEUE_MODE", "token_bucket"),
+            "rate": float(os.getenv("EVENT_QUEUE_RATE", "10")),
+            "burst": int(os.getenv("EVENT_QUEUE_BURST", "5")),
+            "overflow": os.getenv("EVENT_QUEUE_OVERFLOW", "drop_lowest"),
+        },
+        server_url=os.getenv("BC_SERVER_URL", "https://bondage-club-server.herokuapp.com/"),
+        chat_coalesce_window=float(os.getenv("CHAT_COALESCE_WINDOW", "0.3")),
+        json_codec=get_json_codec(os.getenv("JSON_CODEC", "auto")),
+        record_path=os.getenv("TRAFFIC_RECORD_PATH") or None,
+        metrics_port=int(os.getenv("METRICS_PORT") or 0) or None,
+        profile_dir=os.getenv("PROFILE_DIR", "."),
+        alert_thresholds=[duration(t) for t in os.getenv("ALERT_THRESHOLDS", "1天,1小时").split(",") if t],
+        board_interval=duration(os.getenv("BOARD_INTERVAL") or "0"),
+    )
+
+
+run = asyncio.run
+if os.getenv("USE_UVLOOP", "0") == "1":
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:
+        get_logger(__name__).warning("uvloop is not installed, using the default event loop")
+
+try:
+    if os.getenv("HOT_STANDBY", "0") == "1":
+        # the lease lives next to the timers, so both processes must share TIMER_DB_PATH
+        lease = Lease(
+            os.getenv("TIMER_DB_PATH", "jail_timers.db"),
+            name=chatroom_config["Name"],
+            ttl=float(os.getenv("LEASE_TTL", "15")),
+        )
+        run(HotStandby(make_bot, lease).run())
+    else:
+        run(make_bot().run())
+except KeyboardInterrupt:
+    pass  # the bot has already shut down
@@ -0,0 +1,13 @@
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+from utils.bot_supervisor import load_bot_configs, run_bots
+
+config = load_bot_configs(os.getenv("BOTS_CONFIG", "bots_config.json"))
+
+run_bots(
+    config["bots"],
+    processes=int(os.getenv("BOT_PROCESSES", config.get("processes", 1))),
+    queue_logging=os.getenv("LOG_QUEUE", "0") == "1",
+)
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+from lzstring import LZString
+
+from bot import BCBot
+from utils.appearance import AppearanceIndex, decode_appearance_code
+from utils.room_state import RoomMember
+
+APPEARANCE = [
+    {"Group": "Cloth", "Name": "Dress", "Color": "#FFFFFF"},
+    {"Group": "Hat", "Name": "Beret", "Color": "Default", "Property": {"Type": None}},
+]
+
+
+def test_decoded_code_is_cached_by_hash(tmp_path):
+    code = LZString.compressToBase64(json.dumps(APPEARANCE))
+    assert decode_appearance_code(code, str(tmp_path)) == APPEARANCE
+    (cached,) = tmp_path.iterdir()
+
+    # the second decode is served from the cache file
+    cached.write_text(json.dumps(APPEARANCE[:1]))
+    assert decode_appearance_code(code, str(tmp_path)) == APPEARANCE[:1]
+    assert decode_appearance_code("") is None
+
+
+def test_matches_ignores_item_order():
+    index = AppearanceIndex(APPEARANCE)
+    assert index.matches(list(reversed(APPEARANCE)))
+    assert not index.matches(APPEARANCE[:1])
+    assert not index.matches([APPEARANCE[0], {**APPEARANCE[1], "Color": "#000000"}])
+
+
+def test_apply_replaces_in_place_and_removes():
+    index = AppearanceIndex(APPEARANCE)
+    assert index.to_list() == APPEARANCE
+
+    gown = {"Group": "Cloth", "Name": "Gown", "Color": "#000000"}
+    index.apply(gown)
+    # replaced in its slot, so the list keeps the server's order
+    assert index.to_list() == [gown, APPEARANCE[1]]
+
+    index.apply({"Group": "Cloth"})
+    assert "Cloth" not in index
+    assert index.to_list() == [APPEARANCE[1]]
+
+
+def test_sync_item_without_name_removes_the_group_from_others():
+    async def main():
+        bot = BCBot(username="test", password="", chatroom_settings={"Name": "test"})
+        bot.others = {5: RoomMember(5, "5", appearance=AppearanceIndex(APPEARANCE))}
+        await bot.event_handlers["ChatRoomSyncItem"]({"Source": 5, "Item": {"Target": 5, "Group": "Hat"}})
+        return bot.others[5].appearance
+
+    appearance = asyncio.run(main())
+    assert appearance.get("Hat") is None
+    assert appearance.to_list() == APPEARANCE[:1]
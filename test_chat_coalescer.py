@@ -0,0 +1,51 @@
+import asyncio
+
+from utils.chat_coalescer import ChatCoalescer
+
+
+class _Queue:
+    def __init__(self):
+        self.sent = []
+
+    def is_pending(self, dedupe_key) -> bool:
+        return False
+
+    async def put_event(self, event_name, data, dedupe_key=None) -> bool:
+        self.sent.append(data["Content"])
+        return True
+
+
+def test_first_message_is_sent_at_once_and_the_rest_merged():
+    async def main():
+        queue = _Queue()
+        coalescer = ChatCoalescer(queue, window=0.05)
+        await coalescer.add("a")
+        assert queue.sent == ["a"]
+        await coalescer.add("b")
+        await coalescer.add("c")
+        assert queue.sent == ["a"]
+        await asyncio.sleep(0.08)
+        assert queue.sent == ["a", "b\nc"]
+
+        # once a window passes without messages the next one goes out directly
+        await asyncio.sleep(0.1)
+        await coalescer.add("d")
+        assert queue.sent == ["a", "b\nc", "d"]
+        await coalescer.flush()
+
+    asyncio.run(main())
+
+
+def test_duplicate_lines_in_a_window_are_sent_once():
+    async def main():
+        queue = _Queue()
+        coalescer = ChatCoalescer(queue, window=60)
+        for msg in ("a", "b", "c", "b", "c"):
+            await coalescer.add(msg)
+        await coalescer.flush()
+        # the buffer is empty again, so the same line is accepted
+        await coalescer.add("b")
+        await coalescer.flush()
+        return queue.sent, coalescer.stats["duplicates"]
+
+    assert asyncio.run(main()) == (["a", "b\nc", "b"], 2)
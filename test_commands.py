@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from utils.commands import CommandTable, CommandError, player_id, duration, duration_seconds, optional
+
+
+def test_duration():
+    assert duration("3天") == 3 * 86400
+    assert duration("+2天") == 2 * 86400
+    assert duration("-1天") == -86400
+    assert duration("1天2小时30分钟") == 86400 + 2 * 3600 + 30 * 60
+    assert duration("45分钟") == 45 * 60
+    assert duration("1分30秒") == 90
+    assert duration("2") == 2 * 86400
+    with pytest.raises(CommandError):
+        duration("abc")
+    with pytest.raises(CommandError):
+        duration("天")
+
+
+def test_duration_seconds():
+    assert duration_seconds("60") == 60
+    assert duration_seconds("5分钟") == 300
+    assert duration_seconds("1天") == 86400
+
+
+def test_dispatch():
+    calls = []
+    errors = []
+
+    async def sentence(playerid, seconds=None):
+        calls.append((playerid, seconds))
+
+    async def on_error(msg):
+        errors.append(msg)
+
+    async def main():
+        table = CommandTable(prefix="N", on_error=on_error)
+        table.register("审判", sentence, player_id, optional(duration))
+        assert not await table.dispatch("hello")
+        assert not await table.dispatch("N 未知 1")
+        assert await table.dispatch("N 审判 123 2天")
+        assert await table.dispatch("N 审判 123")
+        assert await table.dispatch("N 审判 abc 2天")
+        assert await table.dispatch("N 审判")
+
+    asyncio.run(main())
+    assert calls == [(123, 2 * 86400), (123, None)]
+    assert len(errors) == 2
@@ -0,0 +1,80 @@
+import asyncio
+import socket
+
+from bench.benchmark import wait_until
+from bench.fake_server import FakeBCServer
+from bot import BCBot
+from utils.connection_supervisor import ConnectionState, ConnectionSupervisor
+
+ROOM = {"Name": "test room", "Admin": [], "Ban": [], "Limit": 10}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _with_bot(test, username: str = "test", request_timeout: float = 5):
+    server = FakeBCServer(port=_free_port())
+    await server.start()
+    server.create_room(ROOM)
+    bot = BCBot(username=username, password="x", chatroom_settings=ROOM, request_timeout=request_timeout)
+    bot.supervisor = ConnectionSupervisor(bot, server.url, base_delay=0.05, max_delay=0.1)
+    await bot.event_queue.start()
+    task = asyncio.create_task(bot.supervisor.run())
+    try:
+        await test(server, bot)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await bot.disconnect()
+        await bot.event_queue.shutdown()
+        await server.stop()
+
+
+def test_rejoins_after_the_server_drops_the_socket():
+    async def test(server, bot):
+        supervisor = bot.supervisor
+        await wait_until(lambda: supervisor.state == ConnectionState.IN_ROOM, timeout=10)
+        first_sid = server.sessions["test"]
+
+        # the next login waits in the queue longer than request_timeout
+        server.login_queue = 3
+        await server.drop_all_clients()
+        await wait_until(lambda: supervisor.metrics["reconnects"] == 1, timeout=10)
+        assert supervisor.state == ConnectionState.IN_ROOM
+        assert supervisor.metrics["sessions"] == 2
+        assert supervisor.metrics["last_downtime"] > 0
+        sid = server.sessions["test"]
+        assert sid != first_sid and server.room_of[sid] == ROOM["Name"]
+
+    asyncio.run(_with_bot(test, request_timeout=0.1))
+
+
+def test_rejected_login_backs_off(caplog):
+    async def test(server, bot):
+        supervisor = bot.supervisor
+        await wait_until(lambda: supervisor.metrics["failed_attempts"] >= 2, timeout=10)
+        assert supervisor.metrics["sessions"] == 0
+        assert supervisor.state != ConnectionState.IN_ROOM
+
+    asyncio.run(_with_bot(test, username=""))
+    failures = [r for r in caplog.records if r.getMessage().startswith("Session failed")]
+    assert failures and all("ResponseError('Login failed: InvalidNamePassword')" in r.getMessage() for r in failures)
+
+
+def test_join_to_a_missing_room_backs_off(caplog):
+    async def test(server, bot):
+        supervisor = bot.supervisor
+        await wait_until(lambda: supervisor.state == ConnectionState.IN_ROOM, timeout=10)
+
+        bot.enter_chatroom = lambda: bot.join_chatroom("missing room")
+        await server.drop_all_clients()
+        await wait_until(lambda: supervisor.metrics["failed_attempts"] >= 1, timeout=10)
+        assert supervisor.metrics["reconnects"] == 0
+        assert supervisor.state != ConnectionState.IN_ROOM
+
+    asyncio.run(_with_bot(test))
+    failures = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Session failed in state joining")]
+    assert failures and "ResponseError('Failed to join chatroom: CannotFindRoom')" in failures[0]
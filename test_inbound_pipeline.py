@@ -0,0 +1,50 @@
+import asyncio
+
+from utils.inbound_pipeline import InboundPipeline
+
+
+def test_lanes_are_ordered_per_sender_and_concurrent_across_senders():
+    handled = []
+    active = set()
+    overlap = []
+
+    async def handler(data):
+        sender, i = data
+        active.add(sender)
+        overlap.append(len(active))
+        await asyncio.sleep(0.01)
+        active.discard(sender)
+        handled.append(data)
+
+    async def main():
+        pipeline = InboundPipeline(handler)
+        for i in range(3):
+            for sender in ("a", "b"):
+                pipeline.submit(sender, (sender, i))
+        await pipeline.join()
+        assert pipeline.pending == 0
+
+    asyncio.run(main())
+    assert [i for s, i in handled if s == "a"] == [0, 1, 2]
+    assert [i for s, i in handled if s == "b"] == [0, 1, 2]
+    assert max(overlap) == 2
+
+
+def test_overflow_drops_from_busiest_sender():
+    async def handler(data):
+        await asyncio.sleep(0.01)
+
+    async def main():
+        pipeline = InboundPipeline(handler, max_pending=3)
+        for i in range(3):
+            assert pipeline.submit("spammer", i)
+        assert pipeline.submit("admin", "N 时间 1")
+        assert list(pipeline._lanes["spammer"]) == [0, 2]
+        assert pipeline.stats["dropped"] == 1
+
+        full = InboundPipeline(handler, max_pending=1, overflow="drop_new")
+        assert full.submit("a", 1)
+        assert not full.submit("b", 2)
+        await pipeline.join()
+
+    asyncio.run(main())
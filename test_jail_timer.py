@@ -1,31 +1,275 @@
-from utils.jail_timer import JailTimer
 import asyncio
-import logging
+import sqlite3
+
+import pytest
+
+from utils.clock import VirtualClock
+from utils.jail_timer import JailTimer
+from utils.timer_engine import TimerEngine
+from utils.timer_store import TimerStore
+from utils.room_state import RoomMember
+from bot_jail_timer import BCBotJailTimer
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def _clear_chat(bot):
+    """Forget the chat lines buffered so far"""
+    bot.chat_coalescer._lines.clear()
+    bot.chat_coalescer._buffered.clear()
+
+
+def make_timers(n, clock, finished, days=lambda i: i + 1):
+    engine = TimerEngine(clock)
+
+    async def on_finish(info=None):
+        finished.append((clock.monotonic(), info))
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+    async def setup():
+        timers = []
+        for i in range(n):
+            timer = JailTimer(on_finish_handler=on_finish, engine=engine, info=i)
+            await timer.add_time(days=days(i))
+            await timer.start()
+            timers.append(timer)
+        return timers
+    return engine, setup
 
 
-async def main():
-    async def on_finish(info: str = None):
-        logger.info(f"Timer finished! {info}")
+def test_countdown():
+    async def main():
+        clock = VirtualClock()
+        finished = []
+        _, setup = make_timers(3, clock, finished, days=lambda i: i * 5)
+        timers = await setup()
+
+        await clock.advance(seconds=3)
+        assert await timers[1].get_remaining_time() == "4 days, 23:59:57"
+        assert [info for _, info in finished] == [0]
+
+        await clock.advance(days=5)
+        assert [info for _, info in finished] == [0, 1]
+        assert await timers[2].get_remaining_time() == "4 days, 23:59:57"
+    run(main())
+
+
+def test_pause_resume_and_add_time():
+    async def main():
+        clock = VirtualClock()
+        finished = []
+        _, setup = make_timers(1, clock, finished, days=lambda i: 1)
+        (timer,) = await setup()
+
+        await clock.advance(hours=6)
+        await timer.pause()
+        await clock.advance(days=10)
+        assert not finished
+        assert timer.remaining_seconds == 18 * 3600
 
-    timers = {
-        "timer1": JailTimer(on_finish_handler=on_finish, info="timer1"),
-        "timer2": JailTimer(on_finish_handler=on_finish, info="timer2"),
-        "timer3": JailTimer(on_finish_handler=on_finish, info="timer3"),
-    }
-    for idx, timer in enumerate(timers.values()):
-        await timer.add_time(days=idx * 5)
         await timer.start()
+        await timer.add_time(hours=-17)
+        await clock.advance(minutes=59)
+        assert not finished
+        await clock.advance(minutes=1)
+        assert finished == [(clock.monotonic(), 0)]
+    run(main())
+
+
+def test_thousands_of_sentences_fire_in_order():
+    async def main():
+        clock = VirtualClock()
+        finished = []
+        engine, setup = make_timers(5000, clock, finished, days=lambda i: (i * 7919) % 30 + 1)
+        timers = await setup()
+        for timer in timers[::2]:
+            await timer.add_time(hours=1)
+
+        await clock.advance(days=15)
+        assert len(finished) == sum(1 for t in timers if t.total_seconds <= 15 * 86400)
+        await clock.advance(days=20)
+        assert len(finished) == 5000
+        assert len(engine) == 0
+
+        times = [t for t, _ in finished]
+        assert times == sorted(times)
+        for t, info in finished:
+            assert t == timers[info].total_seconds
+    run(main())
+
+
+def test_store_counts_downtime(tmp_path):
+    async def main():
+        clock = VirtualClock()
+        store = TimerStore(str(tmp_path / "timers.db"), clock=clock)
+        engine = TimerEngine(clock)
+        running = JailTimer(engine=engine)
+        paused = JailTimer(engine=engine)
+        await running.add_time(days=2)
+        await running.start()
+        await paused.add_time(days=2)
+        store.save(1, running.snapshot())
+        store.save(2, paused.snapshot())
+        await store.close()
+
+        # the bot is down for three days
+        await clock.advance(days=3)
+        loaded = TimerStore(str(tmp_path / "timers.db"), clock=clock).load_all()
+        assert loaded[1]["running"] and loaded[1]["remaining_seconds"] == 0
+        assert not loaded[2]["running"] and loaded[2]["remaining_seconds"] == 2 * 86400
+    run(main())
+
+
+def test_room_sync_reconciles_timers_in_one_pass():
+    async def main():
+        clock = VirtualClock()
+        bot = BCBotJailTimer(
+            username="test", password="", chatroom_settings={"Name": "test", "Admin": [], "Ban": []},
+            timer_db_path=":memory:", clock=clock, chat_coalesce_window=60,
+        )
+        bot.others = {i: RoomMember(i, str(i)) for i in range(100)}
+        for i in range(0, 100, 2):
+            await bot.sentence(i, 86400)
+        # sentenced while the bot was away, loaded paused
+        for i in range(100, 200, 2):
+            bot.timer_list[i] = bot._new_timer(i)
+            await bot.timer_list[i].add_time(days=1)
+        _clear_chat(bot)
+
+        # half of the present players left, all absent sentenced players came back
+        bot.others = {i: RoomMember(i, str(i)) for i in range(50, 200)}
+        await bot.reconcile_members()
+        running = {i for i, t in bot.timer_list.items() if t._running}
+        assert running == set(range(50, 200, 2))
+        assert len(bot.chat_coalescer._lines) == 1
+        assert "25 人" in bot.chat_coalescer._lines[0] and "50 人" in bot.chat_coalescer._lines[0]
+
+        # nothing changed, nothing is posted
+        _clear_chat(bot)
+        await bot.reconcile_members()
+        assert not bot.chat_coalescer._lines
+        await bot.chat_coalescer.flush()
+        await bot.timer_engine.shutdown()
+        await bot.timer_store.close()
+    run(main())
+
+
+def test_absent_player_timer_does_not_drain_across_restarts(tmp_path):
+    async def main():
+        clock = VirtualClock()
+
+        def make_bot():
+            return BCBotJailTimer(
+                username="test", password="", chatroom_settings={"Name": "test", "Admin": [], "Ban": []},
+                timer_db_path=str(tmp_path / "timers.db"), clock=clock,
+            )
+
+        async def stop(bot):
+            await bot.chat_coalescer.flush()
+            await bot.timer_engine.shutdown()
+            await bot.timer_store.close()
+
+        bot = make_bot()
+        bot.others = {1: RoomMember(1, "1")}
+        await bot.sentence(1, 3 * 86400)
+        await stop(bot)
+
+        # restarted while player 1 is away and kept running for two days
+        bot = make_bot()
+        await bot.reconcile_state()
+        assert not bot.timer_list[1]._running
+        await clock.advance(days=2)
+        await stop(bot)
+
+        bot = make_bot()
+        assert bot.timer_list[1].remaining_seconds == 3 * 86400
+        await stop(bot)
+    run(main())
+
+
+def test_member_join_and_leave_resume_and_pause_timers():
+    async def main():
+        clock = VirtualClock()
+        bot = BCBotJailTimer(
+            username="test", password="", chatroom_settings={"Name": "test", "Admin": [], "Ban": []},
+            timer_db_path=":memory:", clock=clock, chat_coalesce_window=60,
+        )
+        bot.player = {"MemberNumber": 0, "SubmissivesList": []}
+        bot.timer_list[1] = bot._new_timer(1)
+        await bot.timer_list[1].add_time(days=1)
+        await bot.send_to_chat("window opened")
+        _clear_chat(bot)
+
+        # a single change keeps the per-player message with the remaining time
+        await bot.event_handlers["ChatRoomSyncMemberJoin"](
+            {"SourceMemberNumber": 1, "Character": {"MemberNumber": 1, "Name": "1"}}
+        )
+        assert 1 in bot.others and bot.timer_list[1]._running
+        await bot.event_handlers["ChatRoomSyncMemberLeave"]({"SourceMemberNumber": 1})
+        assert 1 not in bot.others and not bot.timer_list[1]._running
+        assert bot.chat_coalescer._lines == [
+            "玩家 1 计时器继续，剩余时间为：1 days, 00:00:00",
+            "玩家 1 计时器暂停，剩余时间为：1 days, 00:00:00",
+        ]
+        await bot.chat_coalescer.flush()
+        await bot.timer_engine.shutdown()
+        await bot.timer_store.close()
+    run(main())
+
+
+def test_threshold_alerts_and_board():
+    async def main():
+        clock = VirtualClock()
+        bot = BCBotJailTimer(
+            username="test", password="", chatroom_settings={"Name": "test", "Admin": [], "Ban": []},
+            timer_db_path=":memory:", clock=clock, alert_thresholds=(86400, 3600),
+            chat_coalesce_window=60,
+        )
+        bot.others = {i: RoomMember(i, str(i)) for i in (1, 2, 3)}
+        await bot.sentence(1, 2 * 86400)
+        await bot.sentence(2, 5400)
+        await bot.sentence(3, 3000)  # already under every threshold
+        _clear_chat(bot)
+
+        await clock.advance(minutes=30)
+        assert bot.chat_coalescer._lines == ["玩家 2 的剩余时间已不足 1小时"]
+        _clear_chat(bot)
+
+        # a paused sentence crosses nothing; adding time re-arms the alert
+        await bot.pause_timer(1)
+        await clock.advance(days=2)
+        await bot.update_time(1, 86400)
+        await bot.start_timer(1)
+        _clear_chat(bot)
+        await clock.advance(days=2)
+        assert "玩家 1 的剩余时间已不足 1天" in bot.chat_coalescer._lines
+
+        assert bot.board_lines() == ["名单（1 人）：", "1 23:30:00"]
+        await bot.chat_coalescer.flush()
+        await bot.timer_engine.shutdown()
+        await bot.timer_store.close()
+    run(main())
+
 
-    await asyncio.sleep(3)
-    for timer in timers.values():
-        logger.info(f"Remaining time: {await timer.get_remaining_time()}")
+def test_failed_flush_keeps_changes(tmp_path):
+    async def main():
+        clock = VirtualClock()
+        path = str(tmp_path / "timers.db")
+        store = TimerStore(path, clock=clock)
+        store.save(1, {"remaining_seconds": 100, "running": False, "total_seconds": 100})
 
-    await asyncio.sleep(4)
-    for timer in timers.values():
-        logger.info(f"Remaining time: {await timer.get_remaining_time()}")
+        # another process holds the write lock
+        blocker = sqlite3.connect(path, timeout=0)
+        blocker.execute("BEGIN IMMEDIATE")
+        store._conn.execute("PRAGMA busy_timeout = 0")
+        with pytest.raises(sqlite3.OperationalError):
+            await store.flush()
+        store.save(2, {"remaining_seconds": 50, "running": False, "total_seconds": 50})
+        blocker.rollback()
+        blocker.close()
 
-if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+        await store.close()
+        loaded = TimerStore(path, clock=clock).load_all()
+        assert sorted(loaded) == [1, 2]
+    run(main())
@@ -0,0 +1,58 @@
+import asyncio
+
+from utils.clock import VirtualClock
+from utils.lease import Lease
+from utils.timer_store import TimerStore
+
+
+def test_one_holder_until_expiry(tmp_path):
+    async def main():
+        clock = VirtualClock()
+        path = str(tmp_path / "timers.db")
+        active = Lease(path, name="room", ttl=15, holder="a", clock=clock)
+        standby = Lease(path, name="room", ttl=15, holder="b", clock=clock)
+
+        assert await active.acquire()
+        assert not await standby.acquire()
+        await clock.advance(seconds=10)
+        assert await active.renew()
+        await clock.advance(seconds=10)
+        assert not await standby.acquire()
+
+        # the active process stops renewing
+        await clock.advance(seconds=6)
+        assert await standby.acquire()
+        assert not await active.renew()
+        assert not await active.acquire()
+        assert standby.current_holder()[0] == "b"
+
+        await standby.release()
+        assert await active.acquire()
+        active.close()
+        standby.close()
+    asyncio.run(main())
+
+
+def test_store_writes_need_the_lease(tmp_path):
+    async def main():
+        clock = VirtualClock()
+        path = str(tmp_path / "timers.db")
+        active = Lease(path, name="room", ttl=15, holder="a", clock=clock)
+        standby = Lease(path, name="room", ttl=15, holder="b", clock=clock)
+        store = TimerStore(path, clock=clock)
+        store.lease = active
+        snapshot = {"remaining_seconds": 60, "running": False, "total_seconds": 60}
+
+        assert await active.acquire()
+        store.save(1, snapshot)
+        await store.flush()
+
+        # the lease expires and the standby takes over before the next flush
+        await clock.advance(seconds=16)
+        assert await standby.acquire()
+        store.save(2, snapshot)
+        await store.close()
+        assert set(TimerStore(path, clock=clock).load_all()) == {1}
+        active.close()
+        standby.close()
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+import pytest
+
+from bot import BCBot
+from utils.metrics import Histogram, MetricsWriter
+from utils.room_state import RoomMember
+
+
+def test_histogram_quantile_is_bucket_upper_bound():
+    hist = Histogram(buckets=(0.01, 0.1, 1))
+    for value in (0.005, 0.01, 0.05, 0.5, 5):
+        hist.observe(value)
+
+    assert hist.counts == [2, 1, 1, 1]
+    assert hist.quantile(0.4) == 0.01
+    assert hist.quantile(0.8) == 1
+    assert hist.quantile(1.0) == float("inf")
+    assert hist.sum == pytest.approx(5.565)
+
+
+def test_writer_declares_each_metric_once():
+    hist = Histogram(buckets=(0.1,))
+    hist.observe(0.05)
+    out = MetricsWriter(prefix="t_")
+    out.gauge("timers", "Timers", 3, state="running")
+    out.gauge("timers", "Timers", 1, state="paused")
+    out.histogram("handler_seconds", "Handlers", hist, event="Sync")
+    text = out.text()
+
+    assert text.count("# TYPE t_timers gauge") == 1
+    assert 't_timers{state="paused"} 1' in text
+    assert 't_handler_seconds_bucket{event="Sync",le="0.1"} 1' in text
+    assert 't_handler_seconds_bucket{event="Sync",le="+Inf"} 1' in text
+    assert 't_handler_seconds_count{event="Sync"} 1' in text
+
+
+def test_room_memory_report_is_cached():
+    bot = BCBot(username="test", password="", chatroom_settings={"Name": "test"})
+    bot.others = {1: RoomMember(1, "1")}
+    first = bot.room_memory_report()
+    bot.others[2] = RoomMember(2, "2")
+    cached = bot.room_memory_report()
+    assert cached["members"] == 2 and cached["bytes"] == first["bytes"]
+    assert bot.room_memory_report(max_age=0)["bytes"] > first["bytes"]
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from utils.socket_event_queue import SocketEventQueue
+from utils.traffic_recorder import TrafficRecorder, read_traffic
+
+
+class _Sio:
+    def __init__(self):
+        self.emitted = []
+        self.times = []
+
+    async def emit(self, event, data=None):
+        self.emitted.append((event, data))
+        self.times.append(time.monotonic())
+
+
+async def _drain(queue: SocketEventQueue, sent: int):
+    await queue.start()
+    while queue.stats["sent"] < sent:
+        await asyncio.sleep(0.005)
+    await queue.shutdown()
+
+
+def test_control_event_overtakes_queued_chat():
+    async def main():
+        sio = _Sio()
+        queue = SocketEventQueue(sio)
+        await queue.put_event("ChatRoomChat", {"Content": "hi"})
+        await queue.put_event("AccountUpdate", {})
+        await queue.put_event("AccountLogin", {})
+        await _drain(queue, 3)
+        return [event for event, _ in sio.emitted]
+
+    assert asyncio.run(main()) == ["AccountLogin", "AccountUpdate", "ChatRoomChat"]
+
+
+def test_token_bucket_bursts_then_holds_rate():
+    async def main():
+        sio = _Sio()
+        queue = SocketEventQueue(sio, rate=20, burst=3)
+        for i in range(6):
+            await queue.put_event("ChatRoomChat", {"Content": str(i)})
+        await _drain(queue, 6)
+        return sio.times
+
+    times = asyncio.run(main())
+    assert times[2] - times[0] < 0.02
+    gaps = [b - a for a, b in zip(times[2:], times[3:])]
+    assert all(gap >= 0.04 for gap in gaps)
+
+
+def test_drop_lowest_evicts_chat_for_control_event():
+    async def main():
+        queue = SocketEventQueue(_Sio(), max_size=2, overflow="drop_lowest")
+        assert await queue.put_event("ChatRoomChat", {"Content": "a"})
+        assert await queue.put_event("ChatRoomChat", {"Content": "b"})
+        assert await queue.put_event("ChatRoomJoin", {})
+        # nothing ranks below another chat message
+        assert not await queue.put_event("ChatRoomChat", {"Content": "c"})
+        return sorted((entry[3], entry[4]) for entry in queue._heap), queue.stats["dropped"]
+
+    queued, dropped = asyncio.run(main())
+    assert queued == [("ChatRoomChat", {"Content": "a"}), ("ChatRoomJoin", {})]
+    assert dropped == 2
+
+
+def test_drop_new_discards_the_incoming_event():
+    async def main():
+        queue = SocketEventQueue(_Sio(), max_size=1, overflow="drop_new")
+        assert await queue.put_event("ChatRoomChat", {"Content": "a"})
+        assert not await queue.put_event("AccountLogin", {})
+        return [entry[3] for entry in queue._heap], queue.stats["dropped"]
+
+    assert asyncio.run(main()) == (["ChatRoomChat"], 1)
+
+
+def test_fifo_keeps_arrival_order_and_spacing():
+    async def main():
+        sio = _Sio()
+        queue = SocketEventQueue(sio, mode="fifo", interval=0.03)
+        await queue.put_event("ChatRoomChat", {"Content": "a"})
+        await queue.put_event("AccountLogin", {})
+        await queue.put_event("ChatRoomChat", {"Content": "b"})
+        await _drain(queue, 3)
+        return sio.emitted, sio.times
+
+    emitted, times = asyncio.run(main())
+    assert [event for event, _ in emitted] == ["ChatRoomChat", "AccountLogin", "ChatRoomChat"]
+    assert all(b - a >= 0.025 for a, b in zip(times, times[1:]))
+
+
+def test_only_sent_events_are_recorded(tmp_path):
+    path = str(tmp_path / "traffic.jsonl.gz")
+
+    async def main():
+        sio = _Sio()
+        queue = SocketEventQueue(sio, mode="fifo", interval=0, max_size=1, overflow="drop_new")
+        queue.recorder = TrafficRecorder(path)
+        assert await queue.put_event("ChatRoomChat", {"Content": "a"}, dedupe_key="a")
+        assert not await queue.put_event("ChatRoomChat", {"Content": "a"}, dedupe_key="a")
+        assert not await queue.put_event("ChatRoomChat", {"Content": "b"})
+        await queue.start()
+        while queue.depth:
+            await asyncio.sleep(0.01)
+        await queue.shutdown()
+        queue.recorder.close()
+        return sio.emitted
+
+    emitted = asyncio.run(main())
+    assert emitted == [("ChatRoomChat", {"Content": "a"})]
+    assert [r["data"] for r in read_traffic(path) if r["dir"] == "out"] == [{"Content": "a"}]
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+
+from lzstring import LZString
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AppearanceIndex:
+    """A character's appearance keyed by Group.
+
+    Adding, replacing and removing an item are O(1) dict operations.
+    Insertion order is kept so `to_list()` returns the list form the
+    server uses.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, appearance: list = None):
+        self._items = {item["Group"]: item for item in appearance or []}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, group: str):
+        return group in self._items
+
+    def get(self, group: str):
+        return self._items.get(group)
+
+    def apply(self, item: dict):
+        """Apply a ChatRoomSyncItem item: set it, or remove the group if it has no Name"""
+        if item.get("Name"):
+            self._items[item["Group"]] = item
+        else:
+            self._items.pop(item["Group"], None)
+
+    def remove(self, group: str):
+        self._items.pop(group, None)
+
+    def to_list(self) -> list:
+        return list(self._items.values())
+
+    def matches(self, appearance: list) -> bool:
+        """True if `appearance` holds exactly these items, in any order"""
+        return self._items == AppearanceIndex(appearance)._items
+
+
+def decode_appearance_code(code: str, cache_dir: str = None, codec=json) -> list:
+    """Decode an exported appearance code (LZString base64 of a JSON list).
+
+    With `cache_dir`, the decoded list is kept in `appearance_<hash>.json`
+    there, so later startups with the same code skip the decompression.
+    """
+    if not code:
+        return None
+    if cache_dir is None:
+        return json.loads(LZString.decompressFromBase64(code))
+
+    digest = hashlib.sha256(code.encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"appearance_{digest}.json")
+    try:
+        with open(path, "rb") as f:
+            return codec.loads(f.read())
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        logger.warning("Ignoring corrupt appearance cache %s", path)
+
+    appearance = json.loads(LZString.decompressFromBase64(code))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(appearance, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Could not write appearance cache %s: %s", path, e)
+    return appearance
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from utils.codec import get_json_codec
+from utils.timer_engine import TimerEngine
+from utils.logger import get_logger, enable_queue_logging
+
+logger = get_logger(__name__)
+
+
+def load_bot_configs(path: str) -> dict:
+    """Read a multi-bot config file.
+
+    String values may reference environment variables (`"$BC_PASSWORD"`),
+    and `chatroom` may be a path to a chatroom_config.json-style file.
+    """
+    with open(path, "r") as f:
+        config = json.load(f)
+    bots = []
+    for i, entry in enumerate(config["bots"]):
+        entry = {
+            k: os.path.expandvars(v) if isinstance(v, str) else v
+            for k, v in entry.items()
+        }
+        if isinstance(entry.get("chatroom"), str):
+            with open(entry["chatroom"], "r") as f:
+                entry["chatroom"] = json.load(f)
+        entry.setdefault("name", entry["chatroom"]["Name"])
+        entry.setdefault("timer_db_path", f"jail_timers_{i}.db")
+        bots.append(entry)
+    config["bots"] = bots
+    return config
+
+
+class BotSupervisor:
+    """Runs several bots on one event loop.
+
+    The bots share one TimerEngine and JSON codec. Each bot runs in its own
+    task; when one crashes or its run() returns, only that bot is rebuilt
+    (timers come back from its store) after a jittered backoff.
+    """
+
+    def __init__(self, bot_configs: list, bot_factory=None, base_delay: float = 5.0, max_delay: float = 300.0):
+        self.bot_configs = bot_configs
+        self.bot_factory = bot_factory or self._default_factory
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timer_engine = TimerEngine()
+        self.json_codec = get_json_codec()
+        self.bots = {}
+        self.restarts = {}
+
+    def _default_factory(self, config: dict):
+        from bot_jail_timer import BCBotJailTimer
+
+        options = config.get("options", {})
+        return BCBotJailTimer(
+            username=config["username"],
+            password=config["password"],
+            chatroom_settings=config["chatroom"],
+            appearance_code=config.get("appearance_code"),
+            timer_db_path=config["timer_db_path"],
+            timer_engine=self.timer_engine,
+            json_codec=self.json_codec,
+            **options,
+        )
+
+    async def _run_bot(self, config: dict):
+        name = config["name"]
+        failures = 0
+        while True:
+            started = time.monotonic()
+            try:
+                bot = self.bot_factory(config)
+                self.bots[name] = bot
+                await bot.run()
+                logger.warning("Bot %s stopped", name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Bot %s crashed: %r", name, e, exc_info=e)
+            # a bot that ran for a while before failing starts over with a short delay
+            failures = 1 if time.monotonic() - started > self.max_delay else failures + 1
+            self.restarts[name] = self.restarts.get(name, 0) + 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1)) * random.uniform(0.5, 1)
+            logger.info("Restarting bot %s in %.1fs", name, delay)
+            await asyncio.sleep(delay)
+
+    async def run(self):
+        tasks = [asyncio.create_task(self._run_bot(c)) for c in self.bot_configs]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.timer_engine.shutdown()
+
+
+def _run_in_process(bot_configs: list, queue_logging: bool):
+    if queue_logging:
+        enable_queue_logging()
+    asyncio.run(BotSupervisor(bot_configs).run())
+
+
+def run_bots(bot_configs: list, processes: int = 1, queue_logging: bool = False):
+    """Run all bots, split across `processes` worker processes if more than one"""
+    processes = max(1, min(processes, len(bot_configs)))
+    if processes == 1:
+        _run_in_process(bot_configs, queue_logging)
+        return
+
+    chunks = [bot_configs[i::processes] for i in range(processes)]
+    workers = [
+        multiprocessing.Process(target=_run_in_process, args=(chunk, queue_logging), daemon=True)
+        for chunk in chunks
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
@@ -0,0 +1,110 @@
+import asyncio
+
+from utils.socket_event_queue import SocketEventQueue
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ServerChatMessageMaxLength on the Bondage Club server
+MAX_MESSAGE_LENGTH = 1000
+
+
+def _split_long(messages: list, max_length: int):
+    # a multi-line message too long for one chat message is split at its newlines
+    for message in messages:
+        if len(message) > max_length and "\n" in message:
+            yield from message.split("\n")
+        else:
+            yield message
+
+
+def split_message(lines: list, max_length: int = MAX_MESSAGE_LENGTH) -> list:
+    """Join lines with newlines into as few messages as `max_length` allows"""
+    chunks = []
+    current = ""
+    for line in _split_long(lines, max_length):
+        while len(line) > max_length:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= max_length:
+            current += "\n" + line
+        else:
+            chunks.append(current)
+            current = line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ChatCoalescer:
+    """Merges chat messages sent within `window` seconds into one ChatRoomChat.
+
+    The first message after an idle window is sent right away; messages that
+    follow it are held until the window ends and sent merged. Duplicate
+    lines inside a window are sent once, and a merged message that is
+    identical to one still waiting in the event queue is dropped.
+    """
+
+    def __init__(
+        self,
+        event_queue: SocketEventQueue,
+        window: float = 0.3,
+        max_length: int = MAX_MESSAGE_LENGTH,
+    ):
+        self.event_queue = event_queue
+        self.window = window
+        self.max_length = max_length
+        self._lines = []
+        self._buffered = set()  # same lines as _lines, for O(1) duplicate checks
+        self._flush_task = None
+        self.stats = {"messages": 0, "emitted": 0, "duplicates": 0}
+
+    async def add(self, msg: str):
+        self.stats["messages"] += 1
+        if msg in self._buffered:
+            self.stats["duplicates"] += 1
+            return
+        self._lines.append(msg)
+        self._buffered.add(msg)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+            await self._emit()
+
+    async def _flush_later(self):
+        # keep the window open while messages keep arriving
+        while True:
+            await asyncio.sleep(self.window)
+            if not self._lines:
+                self._flush_task = None
+                return
+            # flush() may cancel us; don't drop lines already taken off the buffer
+            await asyncio.shield(self._emit())
+
+    async def flush(self):
+        """Send everything buffered right away"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._emit()
+
+    async def _emit(self):
+        lines, self._lines = self._lines, []
+        self._buffered = set()
+        for chunk in split_message(lines, self.max_length):
+            key = ("ChatRoomChat", chunk)
+            if self.event_queue.is_pending(key):
+                self.stats["duplicates"] += 1
+                continue
+            if await self.event_queue.put_event(
+                "ChatRoomChat",
+                {"Content": chunk, "Type": "Chat", "Target": None},
+                dedupe_key=key,
+            ):
+                self.stats["emitted"] += 1
+        if len(lines) > 1:
+            logger.debug("Coalesced %s chat messages", len(lines))
@@ -0,0 +1,63 @@
+import asyncio
+import time
+import weakref
+
+
+class Clock:
+    """Real time: monotonic for deadlines, wall time for persistence"""
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def time(self) -> float:
+        return time.time()
+
+    def attach(self, engine):
+        pass
+
+    async def wait(self, event: asyncio.Event, timeout: float):
+        """Wait until `event` is set or `timeout` seconds have passed"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class VirtualClock(Clock):
+    """A clock that only moves when `advance()` is called.
+
+    Timer engines using it never sleep on their own; `advance()` steps
+    through every deadline in the skipped span in order and runs its
+    callbacks before moving on.
+    """
+
+    def __init__(self, start: float = 0.0, wall_start: float = None):
+        self._now = start
+        self._wall_offset = (time.time() if wall_start is None else wall_start) - start
+        self._engines = weakref.WeakSet()
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def time(self) -> float:
+        return self._now + self._wall_offset
+
+    def attach(self, engine):
+        self._engines.add(engine)
+
+    async def wait(self, event: asyncio.Event, timeout: float):
+        await event.wait()
+
+    async def advance(self, seconds: float = 0, days: float = 0, hours: float = 0, minutes: float = 0):
+        target = self._now + days * 86400 + hours * 3600 + minutes * 60 + seconds
+        while True:
+            deadlines = [
+                d for d in (e.next_deadline() for e in self._engines)
+                if d is not None and d <= target
+            ]
+            if not deadlines:
+                break
+            self._now = max(self._now, min(deadlines))
+            for engine in list(self._engines):
+                await engine.run_due()
+        self._now = target
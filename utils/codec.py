@@ -0,0 +1,47 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class OrjsonCodec:
+    """orjson behind the json-module interface python-socketio expects"""
+
+    name = "orjson"
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
+class StdlibCodec:
+    name = "json"
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        return json.dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return json.loads(s, **kwargs)
+
+
+def get_json_codec(name: str = "auto"):
+    """Return a JSON codec: "orjson", "json", or "auto" for orjson when installed"""
+    if name == "json":
+        return StdlibCodec
+    if orjson is not None:
+        return OrjsonCodec
+    if name == "orjson":
+        logger.warning("orjson is not installed, falling back to json")
+    return StdlibCodec
@@ -0,0 +1,121 @@
+import re
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CommandError(Exception):
+    """Bad command input; the message is reported back to chat"""
+
+
+_DURATION_RE = re.compile(
+    r"^(?P<sign>[+-]?)"
+    r"(?:(?P<days>\d+)(?:天|d))?"
+    r"(?:(?P<hours>\d+)(?:小时|时|h))?"
+    r"(?:(?P<minutes>\d+)(?:分钟|分|m))?"
+    r"(?:(?P<seconds>\d+)(?:秒|s))?$"
+)
+
+
+def player_id(token: str) -> int:
+    try:
+        return int(token)
+    except ValueError:
+        raise CommandError(f"无效的玩家编号：{token}")
+
+
+def duration(token: str) -> int:
+    """Parse `[+/-]N天`, `N小时`, `N分钟`, `N秒` or a combination such as `1天2小时` into seconds.
+
+    A bare number is read as days.
+    """
+    if re.fullmatch(r"[+-]?\d+", token):
+        return int(token) * 86400
+    match = _DURATION_RE.match(token)
+    if not match or not any(match.group(k) for k in ("days", "hours", "minutes", "seconds")):
+        raise CommandError(f"无效的时间：{token}")
+    seconds = (
+        int(match.group("days") or 0) * 86400
+        + int(match.group("hours") or 0) * 3600
+        + int(match.group("minutes") or 0) * 60
+        + int(match.group("seconds") or 0)
+    )
+    return -seconds if match.group("sign") == "-" else seconds
+
+
+def duration_seconds(token: str) -> int:
+    """Like `duration`, but a bare number is read as seconds"""
+    if re.fullmatch(r"[+-]?\d+", token):
+        return int(token)
+    return duration(token)
+
+
+class optional:
+    """Marks a command argument as optional"""
+
+    def __init__(self, parser):
+        self.parser = parser
+
+
+class Command:
+    __slots__ = ("name", "handler", "args", "usage")
+
+    def __init__(self, name, handler, args, usage):
+        self.name = name
+        self.handler = handler
+        self.args = args
+        self.usage = usage
+
+    def parse(self, tokens: list) -> list:
+        required = sum(1 for a in self.args if not isinstance(a, optional))
+        if not required <= len(tokens) <= len(self.args):
+            raise CommandError(f"用法：{self.usage}")
+        return [
+            (a.parser if isinstance(a, optional) else a)(token)
+            for a, token in zip(self.args, tokens)
+        ]
+
+
+class CommandTable:
+    """Chat commands of the form `<prefix> <name> <args...>`.
+
+    Commands are registered with a handler coroutine and one parser per
+    argument; the message is tokenized once and looked up by name.
+    Messages that don't start with the prefix are rejected before any
+    parsing.
+    """
+
+    def __init__(self, prefix: str = "N", on_error=None):
+        self.prefix = prefix
+        self._head = prefix + " "
+        self._commands = {}
+        self._on_error = on_error
+
+    def register(self, name: str, handler, *args, usage: str = None):
+        self._commands[name] = Command(
+            name, handler, args, usage or f"{self.prefix} {name}"
+        )
+
+    def matches(self, message: str) -> bool:
+        return message.startswith(self._head)
+
+    def __contains__(self, name: str):
+        return name in self._commands
+
+    async def dispatch(self, message: str) -> bool:
+        """Run the command in `message`. Returns False if it is not a command"""
+        if not self.matches(message):
+            return False
+        tokens = message.split()
+        command = self._commands.get(tokens[1]) if len(tokens) > 1 else None
+        if command is None:
+            return False
+        try:
+            args = command.parse(tokens[2:])
+            await command.handler(*args)
+        except CommandError as e:
+            logger.info("Command %s rejected: %s", command.name, e)
+            if self._on_error:
+                await self._on_error(str(e))
+        return True
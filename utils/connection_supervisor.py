@@ -0,0 +1,123 @@
+import asyncio
+import random
+import time
+
+import socketio
+
+from utils.response_waiter import ResponseError
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConnectionState:
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    LOGGING_IN = "logging_in"
+    LOGIN_QUEUED = "login_queued"
+    JOINING = "joining"
+    IN_ROOM = "in_room"
+    BACKOFF = "backoff"
+    STOPPED = "stopped"
+
+
+class ConnectionSupervisor:
+    """Keeps a bot connected, logged in and in its room.
+
+    Every session runs connect -> login -> join -> reconcile; when any step
+    fails or the socket drops, the supervisor waits with jittered
+    exponential backoff and starts over.
+    """
+
+    def __init__(
+        self,
+        bot,
+        url: str,
+        connect_kwargs: dict = None,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        jitter: float = 0.5,
+    ):
+        self.bot = bot
+        self.url = url
+        self.connect_kwargs = connect_kwargs or {}
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.state = ConnectionState.DISCONNECTED
+        self._attempt = 0
+        self._down_since = None
+        self.metrics = {
+            "sessions": 0,
+            "reconnects": 0,
+            "failed_attempts": 0,
+            "total_downtime": 0.0,
+            "last_downtime": None,
+            "last_recovery_time": None,
+            "in_room_since": None,
+        }
+
+    def set_state(self, state: str):
+        if state != self.state:
+            logger.info("Connection state: %s -> %s", self.state, state)
+            self.state = state
+
+    def backoff_delay(self) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** self._attempt)
+        return delay * random.uniform(1 - self.jitter, 1)
+
+    async def _session(self):
+        started = time.monotonic()
+        self.set_state(ConnectionState.CONNECTING)
+        if not await self.bot.connect(self.url, **self.connect_kwargs):
+            raise ConnectionError(f"Could not connect to {self.url}")
+
+        self.set_state(ConnectionState.LOGGING_IN)
+        await self.bot.login()
+
+        self.set_state(ConnectionState.JOINING)
+        await self.bot.enter_chatroom()
+        await self.bot.reconcile_state()
+
+        now = time.monotonic()
+        self.set_state(ConnectionState.IN_ROOM)
+        self.metrics["sessions"] += 1
+        self.metrics["in_room_since"] = now
+        self.metrics["last_recovery_time"] = now - started
+        if self._down_since is not None:
+            downtime = now - self._down_since
+            self.metrics["reconnects"] += 1
+            self.metrics["last_downtime"] = downtime
+            self.metrics["total_downtime"] += downtime
+            logger.info("Recovered after %.1fs down, %.1fs to rejoin", downtime, now - started)
+        self._down_since = None
+        self._attempt = 0
+
+        # cancelling a plain await would cancel engineio's read loop too, and
+        # the bot's disconnect() on shutdown would then fail
+        await asyncio.shield(self.bot.sio.wait())
+
+    async def run(self):
+        while True:
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                self.set_state(ConnectionState.STOPPED)
+                raise
+            except (ConnectionError, asyncio.TimeoutError, ResponseError, socketio.exceptions.SocketIOError) as e:
+                logger.warning("Session failed in state %s: %r", self.state, e)
+                self.metrics["failed_attempts"] += 1
+            except Exception as e:
+                logger.error("Unexpected error in state %s: %r", self.state, e, exc_info=e)
+                self.metrics["failed_attempts"] += 1
+
+            if self._down_since is None and self.metrics["sessions"]:
+                self._down_since = time.monotonic()
+            self.metrics["in_room_since"] = None
+            if self.bot.sio.connected:
+                await self.bot.sio.disconnect()
+            self.set_state(ConnectionState.BACKOFF)
+            delay = self.backoff_delay()
+            self._attempt += 1
+            logger.info("Reconnecting in %.1fs", delay)
+            await asyncio.sleep(delay)
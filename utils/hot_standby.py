@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+import time
+
+from utils.lease import Lease
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class HotStandby:
+    """Runs a bot only while this process holds `lease`.
+
+    Two processes run a HotStandby each over the same lease and timer store.
+    The standby builds its bot up front (appearance decoded, timers loaded),
+    reloads the timers from the store every `refresh_interval` seconds and
+    polls the lease every `poll_interval`. When the active process stops
+    renewing, the lease expires and the standby connects, logs in and joins
+    the room. An active process that fails to renew for a whole `ttl` stops
+    its bot without writing pending timer changes and goes back to standby;
+    the bot's timer store checks the lease in every write transaction, so
+    once the lease has expired nothing this process flushes reaches the
+    store.
+    """
+
+    def __init__(self, bot_factory, lease: Lease, poll_interval: float = 1.0, refresh_interval: float = 30.0):
+        self.bot_factory = bot_factory
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.bot = None
+        self.role = "standby"
+        self.metrics = {"takeovers": 0, "lease_lost": 0, "last_takeover_at": None}
+
+    async def _wait_for_lease(self):
+        refreshed = time.monotonic()
+        while not await self.lease.acquire():
+            if time.monotonic() - refreshed >= self.refresh_interval:
+                self.bot.reload_timers()
+                refreshed = time.monotonic()
+            await asyncio.sleep(self.poll_interval)
+        # catch up with whatever the previous holder flushed last
+        self.bot.reload_timers()
+        self.role = "active"
+        self.metrics["takeovers"] += 1
+        self.metrics["last_takeover_at"] = time.monotonic()
+        logger.info("Acquired lease %s as %s, taking over", self.lease.name, self.lease.holder)
+
+    async def _heartbeat(self):
+        """Renew the lease every ttl/3 seconds; returns once it is lost"""
+        renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(self.lease.ttl / 3)
+            try:
+                if await self.lease.renew():
+                    renewed = time.monotonic()
+                    continue
+                return
+            except sqlite3.Error as e:
+                logger.warning("Failed to renew lease: %s", e)
+                if time.monotonic() - renewed >= self.lease.ttl:
+                    return
+
+    async def _run_active(self):
+        run_task = asyncio.create_task(self.bot.run())
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await asyncio.wait({run_task, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if heartbeat.done():
+                logger.error("Lost lease %s, stopping the bot", self.lease.name)
+                self.metrics["lease_lost"] += 1
+                # the new holder owns the store now
+                self.bot.timer_store.discard_pending()
+            else:
+                logger.warning("Bot stopped, handing the lease over")
+        finally:
+            run_task.cancel()
+            heartbeat.cancel()
+            await asyncio.gather(run_task, heartbeat, return_exceptions=True)
+            self.role = "standby"
+
+    async def run(self):
+        try:
+            while True:
+                self.bot = self.bot_factory()
+                self.bot.timer_store.lease = self.lease
+                await self._wait_for_lease()
+                await self._run_active()
+                await self.lease.release()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            await self.lease.release()
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import deque
+
+from utils.logger import get_logger
+from utils.metrics import Histogram
+
+logger = get_logger(__name__)
+
+OVERFLOW_POLICIES = ("drop_new", "drop_busiest")
+
+
+class InboundPipeline:
+    """Bounded buffer of inbound messages with one ordered lane per sender.
+
+    Messages from the same sender are handled one at a time in arrival
+    order; different senders are handled concurrently, at most
+    `max_workers` at once. When `max_pending` messages are waiting,
+    `overflow` decides what to drop: "drop_new" discards the incoming
+    message, "drop_busiest" discards the oldest waiting message of the sender
+    with the longest backlog.
+    """
+
+    def __init__(self, handler, max_pending: int = 1000, max_workers: int = 16, overflow: str = "drop_busiest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.handler = handler
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self._workers = asyncio.Semaphore(max_workers)
+        self._lanes = {}
+        self._tasks = set()
+        self.pending = 0
+        self.stats = {"accepted": 0, "filtered": 0, "dropped": 0, "max_pending": 0}
+        self.handler_histogram = Histogram()  # handler run time per message
+
+    def submit(self, sender, data) -> bool:
+        """Queue a message on its sender's lane. Returns False if it was dropped"""
+        if self.pending >= self.max_pending:
+            self.stats["dropped"] += 1
+            if self.overflow == "drop_new":
+                logger.warning("Inbound queue full, dropped message from %s", sender)
+                return False
+            busiest = max(self._lanes, key=lambda k: len(self._lanes[k]))
+            if len(self._lanes[busiest]) > 1:
+                del self._lanes[busiest][1]  # [0] is being handled
+            else:
+                # every backlog is a single in-flight message, nothing to evict
+                return False
+            self.pending -= 1
+            logger.warning("Inbound queue full, dropped a message from %s", busiest)
+
+        lane = self._lanes.get(sender)
+        if lane is None:
+            lane = self._lanes[sender] = deque()
+            task = asyncio.create_task(self._drain(sender, lane))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        lane.append(data)
+        self.pending += 1
+        self.stats["accepted"] += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], self.pending)
+        return True
+
+    async def _drain(self, sender, lane: deque):
+        try:
+            while lane:
+                async with self._workers:
+                    started = time.perf_counter()
+                    try:
+                        await self.handler(lane[0])
+                    except Exception as e:
+                        logger.error("Handler failed for message from %s: %r", sender, e, exc_info=e)
+                    self.handler_histogram.observe(time.perf_counter() - started)
+                lane.popleft()
+                self.pending -= 1
+        finally:
+            self.pending -= len(lane)
+            del self._lanes[sender]
+
+    async def join(self):
+        """Wait until every queued message has been handled"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*list(self._tasks), return_exceptions=True)
@@ -1,58 +1,100 @@
-import asyncio
+from utils.timer_engine import TimerEngine
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+_default_engine = None
+
+
+def get_default_engine() -> TimerEngine:
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = TimerEngine()
+    return _default_engine
+
 
 class JailTimer:
     def __init__(
-            self, 
+            self,
             on_finish_handler = None,
+            engine: TimerEngine = None,
             **kwargs
         ):
         self.parameters = kwargs
-        self.remaining_seconds = 0
+        self._engine = engine if engine is not None else get_default_engine()
+        self._remaining = 0  # only meaningful while paused
+        self._deadline = None  # only meaningful while running
         self._running = False
-        self._lock = asyncio.Lock()
+        self.total_seconds = 0
         self._on_finish_handler = on_finish_handler
 
+    @property
+    def remaining_seconds(self) -> int:
+        if self._running:
+            return max(0, round(self._deadline - self._engine.now()))
+        return max(0, round(self._remaining))
+
     async def start(self):
+        if self._running:
+            return
         self._running = True
-        asyncio.create_task(self._run())
+        self._deadline = self._engine.now() + self._remaining
+        self._engine.schedule(self, self._deadline, self._finish)
 
     async def pause(self):
+        if not self._running:
+            return
+        self._remaining = max(0, self._deadline - self._engine.now())
         self._running = False
+        self._deadline = None
+        self._engine.cancel(self)
 
-    async def _run(self):
-        while self._running and self.remaining_seconds > 0:
-            await asyncio.sleep(1)
-            async with self._lock:
-                self.remaining_seconds -= 1
-        
-        if self._running and self.remaining_seconds <= 0:
-            self._running = False
-            if self._on_finish_handler:
-                await self._on_finish_handler(**self.parameters)
+    async def _finish(self):
+        self._running = False
+        self._deadline = None
+        self._remaining = 0
+        if self._on_finish_handler:
+            await self._on_finish_handler(**self.parameters)
 
     async def add_time(
-            self, 
-            days=0, 
-            hours=0, 
-            minutes=0, 
+            self,
+            days=0,
+            hours=0,
+            minutes=0,
             seconds=0,
             ):
         total_seconds = days * 86400 + hours * 3600 + minutes * 60 + seconds
-        async with self._lock:
-            self.remaining_seconds = max(0, self.remaining_seconds + total_seconds)
+        self.total_seconds += total_seconds
+        if self._running:
+            self._deadline = max(self._engine.now(), self._deadline + total_seconds)
+            self._engine.schedule(self, self._deadline, self._finish)
+        else:
+            self._remaining = max(0, self._remaining + total_seconds)
+
+    def snapshot(self) -> dict:
+        """Current state in the form stored by TimerStore"""
+        if self._running:
+            remaining = max(0, self._deadline - self._engine.now())
+        else:
+            remaining = self._remaining
+        return {
+            "remaining_seconds": remaining,
+            "running": self._running,
+            "total_seconds": self.total_seconds,
+        }
+
+    def restore(self, snapshot: dict):
+        """Load a stored snapshot into a paused timer"""
+        self._remaining = max(0, snapshot["remaining_seconds"])
+        self.total_seconds = snapshot["total_seconds"]
 
     async def get_remaining_time(self):
-        async with self._lock:
-            seconds = self.remaining_seconds
-            days = seconds // (24 * 3600)
-            seconds %= 24 * 3600
-            hours = seconds // 3600
-            seconds %= 3600
-            minutes = seconds // 60
-            seconds %= 60
-
-            return f"{days} days, {hours:02}:{minutes:02}:{seconds:02}"
+        seconds = self.remaining_seconds
+        days = seconds // (24 * 3600)
+        seconds %= 24 * 3600
+        hours = seconds // 3600
+        seconds %= 3600
+        minutes = seconds // 60
+        seconds %= 60
+
+        return f"{days} days, {hours:02}:{minutes:02}:{seconds:02}"
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+
+from utils.clock import Clock
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Lease:
+    """A named lease stored in an SQLite table, held by at most one process.
+
+    The holder must `renew()` it before `ttl` seconds pass; once it has
+    expired any other process can `acquire()` it. Acquire and renew are
+    single atomic statements, so two processes sharing the database file
+    (e.g. the timer store) never both hold the lease. Expiry uses wall
+    time, which all processes on the host share.
+    """
+
+    def __init__(self, path: str, name: str = "bot", ttl: float = 15.0, holder: str = None, clock: Clock = None):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.clock = clock or Clock()
+        self.held = False
+        self._db_lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=ttl / 3, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _acquire(self) -> bool:
+        now = self.clock.time()
+        with self._db_lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+                """,
+                (self.name, self.holder, now + self.ttl, now),
+            )
+        return cursor.rowcount == 1
+
+    def _renew(self) -> bool:
+        now = self.clock.time()
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE name = ? AND holder = ? AND expires_at > ?",
+                (now + self.ttl, self.name, self.holder, now),
+            )
+        return cursor.rowcount == 1
+
+    def holds(self, conn: sqlite3.Connection) -> bool:
+        """Whether we still hold the lease, checked inside `conn`'s write
+        transaction; the write lock keeps it ours until that commits"""
+        now = self.clock.time()
+        cursor = conn.execute(
+            "UPDATE leases SET holder = holder WHERE name = ? AND holder = ? AND expires_at > ?",
+            (self.name, self.holder, now),
+        )
+        return cursor.rowcount == 1
+
+    def _release(self):
+        with self._db_lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+
+    def current_holder(self):
+        """(holder, expires_at) of the lease row, or None"""
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)
+            ).fetchone()
+
+    async def acquire(self) -> bool:
+        """Take the lease if it is free, expired or already ours"""
+        self.held = await asyncio.to_thread(self._acquire)
+        return self.held
+
+    async def renew(self) -> bool:
+        """Extend our lease; False if it expired or was taken over"""
+        self.held = await asyncio.to_thread(self._renew)
+        return self.held
+
+    async def release(self):
+        if self.held:
+            await asyncio.to_thread(self._release)
+            self.held = False
+
+    def close(self):
+        self._conn.close()
@@ -1,17 +1,101 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import time
+
+
+class _SharedHandler(logging.Handler):
+    """The one handler every bot logger uses; forwards to the active target.
+
+    The target is a StreamHandler by default, or a QueueHandler once
+    `enable_queue_logging()` has moved stream I/O to a background thread.
+    """
+
+    def __init__(self, target: logging.Handler):
+        super().__init__()
+        self.target = target
+
+    def handle(self, record):
+        return self.target.handle(record)
+
+
+def _make_stream_handler() -> logging.Handler:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(
+        fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    ))
+    return handler
+
+
+_stream_handler = _make_stream_handler()
+_shared_handler = _SharedHandler(_stream_handler)
+_listener = None
+
 
 def get_logger(name: str):
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
 
     if not logger.handlers:
-        formatter = logging.Formatter(
-            fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        )
+        logger.addHandler(_shared_handler)
+
+    return logger
+
+
+def enable_queue_logging():
+    """Write log records from a background thread instead of the event loop"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, _stream_handler)
+    _listener.start()
+    _shared_handler.target = logging.handlers.QueueHandler(log_queue)
+    atexit.register(disable_queue_logging)
+
+
+def disable_queue_logging():
+    """Flush queued records and go back to writing on the calling thread"""
+    global _listener
+    if _listener is None:
+        return
+    _shared_handler.target = _stream_handler
+    _listener.stop()
+    _listener = None
+
+
+class EventSampler:
+    """Per-key token bucket for high-volume log lines.
+
+    `allow(key)` returns True for at most `rate` calls per second per key,
+    with bursts of up to `burst`. Skipped calls are counted in `suppressed`.
+    A rate of 0 disables sampling.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 20):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self.suppressed = {}
+
+    def allow(self, key: str) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
 
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
 
-    return logger
\ No newline at end of file
+log_sampler = EventSampler(
+    rate=float(os.getenv("LOG_SAMPLE_RATE", "10")),
+    burst=int(os.getenv("LOG_SAMPLE_BURST", "20")),
+)
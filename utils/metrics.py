@@ -0,0 +1,123 @@
+import math
+from bisect import bisect_left
+
+from aiohttp import web
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# seconds, from sub-millisecond handler runs up to long queue waits
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Fixed-bucket histogram; `observe` is a bisect and an increment"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (nan when empty)"""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+class MetricsWriter:
+    """Builds a Prometheus text exposition, one HELP/TYPE header per metric name"""
+
+    def __init__(self, prefix: str = "bcbot_"):
+        self.prefix = prefix
+        self._lines = []
+        self._declared = set()
+
+    def _declare(self, name: str, kind: str, help: str):
+        if name not in self._declared:
+            self._declared.add(name)
+            self._lines.append(f"# HELP {name} {help}")
+            self._lines.append(f"# TYPE {name} {kind}")
+
+    @staticmethod
+    def _labels(labels: dict) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+    def gauge(self, name: str, help: str, value, **labels):
+        name = self.prefix + name
+        self._declare(name, "gauge", help)
+        self._lines.append(f"{name}{self._labels(labels)} {value}")
+
+    def counter(self, name: str, help: str, value, **labels):
+        name = self.prefix + name
+        self._declare(name, "counter", help)
+        self._lines.append(f"{name}{self._labels(labels)} {value}")
+
+    def histogram(self, name: str, help: str, hist: Histogram, **labels):
+        name = self.prefix + name
+        self._declare(name, "histogram", help)
+        cumulative = 0
+        bounds = [repr(float(b)) for b in hist.buckets] + ["+Inf"]
+        for bound, n in zip(bounds, hist.counts):
+            cumulative += n
+            self._lines.append(f"{name}_bucket{self._labels({**labels, 'le': bound})} {cumulative}")
+        self._lines.append(f"{name}_sum{self._labels(labels)} {hist.sum}")
+        self._lines.append(f"{name}_count{self._labels(labels)} {hist.count}")
+
+    def text(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+class MetricsServer:
+    """Serves `collect()` (a Prometheus text body) at http://host:port/metrics"""
+
+    def __init__(self, collect, port: int, host: str = "127.0.0.1"):
+        self.collect = collect
+        self.port = port
+        self.host = host
+        self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(
+            body=self.collect().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def format_ms(seconds: float) -> str:
+    """Compact milliseconds for chat summaries"""
+    if math.isnan(seconds):
+        return "-"
+    if math.isinf(seconds):
+        return f">{DEFAULT_BUCKETS[-1]}s"
+    return f"{seconds * 1000:.4g}ms"
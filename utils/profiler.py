@@ -0,0 +1,187 @@
+import asyncio
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# leaf function of the loop thread while it waits for I/O (selectors.*.select)
+_IDLE_FRAMES = frozenset(("select",))
+# debug mode captures a traceback for every new handle and task
+_DEBUG_OVERHEAD_FRAMES = ("format_helpers.py:extract_stack", "traceback.py:extract_stack")
+
+
+class _SlowCallbackCollector(logging.Handler):
+    """Keeps the "Executing <Handle ...> took N seconds" warnings of a debug loop"""
+
+    def __init__(self, maxlen: int = 200):
+        super().__init__(logging.WARNING)
+        self.records = deque(maxlen=maxlen)
+        self.total = 0
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Executing "):
+            self.records.append((record.created, message))
+            self.total += 1
+
+
+class Profiler:
+    """On-demand diagnostics for a stalled event loop.
+
+    While a session runs (at most `max_window` seconds) it:
+    - puts the loop in debug mode so callbacks slower than `slow_callback`
+      seconds are logged by asyncio, and collects those warnings
+    - samples the loop thread's Python stack every `sample_interval` seconds
+      from a background thread, counting collapsed stacks
+    When it ends it dumps every pending task's stack and writes everything to
+    `profile_<timestamp>.txt` in `output_dir`; `on_finish(result)` gets a
+    short summary dict.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = ".",
+        sample_interval: float = 0.005,
+        slow_callback: float = 0.1,
+        max_window: float = 600,
+    ):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.slow_callback = slow_callback
+        self.max_window = max_window
+        self._task = None
+        self._stop = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, window: float, on_finish=None):
+        if self.running:
+            raise RuntimeError("A profiling session is already running")
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._session(min(window, self.max_window), on_finish))
+
+    async def stop(self):
+        """End the running session early and wait for its report"""
+        if self.running:
+            self._stop.set()
+            await self._task
+
+    async def _session(self, window: float, on_finish):
+        loop = asyncio.get_running_loop()
+        debug, threshold = loop.get_debug(), loop.slow_callback_duration
+        collector = _SlowCallbackCollector()
+        asyncio_logger = logging.getLogger("asyncio")
+        asyncio_logger.addHandler(collector)
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.slow_callback
+
+        stacks = Counter()
+        stop_sampling = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), stacks, stop_sampling),
+            name="profiler-sampler",
+            daemon=True,
+        )
+        started = time.monotonic()
+        sampler.start()
+        logger.info("Profiling for up to %ss", window)
+        try:
+            try:
+                await asyncio.wait_for(self._stop.wait(), window)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            stop_sampling.set()
+            await asyncio.to_thread(sampler.join)
+            loop.set_debug(debug)
+            loop.slow_callback_duration = threshold
+            asyncio_logger.removeHandler(collector)
+
+        elapsed = time.monotonic() - started
+        tasks = self._dump_tasks()
+        path = os.path.join(self.output_dir, time.strftime("profile_%Y%m%d_%H%M%S.txt"))
+        result = self._summarize(stacks, elapsed, collector, len(tasks))
+        result["path"] = path
+        await asyncio.to_thread(self._write_report, path, result, stacks, collector, tasks)
+        logger.info("Profile written to %s", path)
+        if on_finish is not None:
+            await on_finish(result)
+        return result
+
+    def _sample(self, thread_id: int, stacks: Counter, stop: threading.Event):
+        while not stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stacks[";".join(reversed(stack))] += 1
+
+    @staticmethod
+    def _summarize(stacks: Counter, elapsed: float, collector, task_count: int) -> dict:
+        samples = sum(stacks.values())
+        busy = Counter()
+        overhead = 0
+        for stack, n in stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if leaf.rsplit(":", 1)[-1] in _IDLE_FRAMES:
+                continue
+            if any(frame in stack for frame in _DEBUG_OVERHEAD_FRAMES):
+                overhead += n
+            else:
+                busy[leaf] += n
+        busy_samples = sum(busy.values()) + overhead
+        return {
+            "elapsed": elapsed,
+            "samples": samples,
+            "busy_ratio": busy_samples / samples if samples else 0.0,
+            "debug_overhead_ratio": overhead / samples if samples else 0.0,
+            "top": busy.most_common(5),
+            "slow_callbacks": collector.total,
+            "tasks": task_count,
+        }
+
+    @staticmethod
+    def _dump_tasks() -> list:
+        dumps = []
+        for task in asyncio.all_tasks():
+            out = io.StringIO()
+            task.print_stack(limit=20, file=out)
+            dumps.append(out.getvalue())
+        return dumps
+
+    @staticmethod
+    def _write_report(path: str, result: dict, stacks: Counter, collector, tasks: list):
+        samples = result["samples"] or 1
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                f"window: {result['elapsed']:.1f}s, samples: {result['samples']}, "
+                f"loop busy: {result['busy_ratio']:.1%} "
+                f"(debug mode overhead: {result['debug_overhead_ratio']:.1%})\n\n"
+            )
+            f.write("== busiest functions (leaf samples, idle and debug overhead excluded) ==\n")
+            for leaf, n in result["top"]:
+                f.write(f"{n / samples:7.1%}  {leaf}\n")
+
+            f.write(f"\n== slow callbacks ({collector.total}, last {len(collector.records)} shown) ==\n")
+            for created, message in collector.records:
+                f.write(f"{time.strftime('%H:%M:%S', time.localtime(created))}  {message}\n")
+
+            f.write(f"\n== pending tasks ({len(tasks)}) ==\n")
+            for dump in tasks:
+                f.write(dump + "\n")
+
+            f.write("== collapsed stacks (flamegraph.pl input) ==\n")
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
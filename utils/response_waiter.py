@@ -0,0 +1,43 @@
+import asyncio
+
+
+class ResponseError(Exception):
+    """The server answered a request with an error"""
+
+
+class ResponseWaiter:
+    """Futures resolved by incoming server events.
+
+    Call `expect()` before emitting the request so the response can't be
+    missed, then `wait()` on the returned future.
+    """
+
+    def __init__(self):
+        self._waiters = {}
+
+    def expect(self, event_name: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(event_name, []).append(future)
+        return future
+
+    def resolve(self, event_name: str, data=None):
+        for future in self._waiters.pop(event_name, []):
+            if not future.done():
+                future.set_result(data)
+
+    def reject(self, event_name: str, exc: Exception):
+        for future in self._waiters.pop(event_name, []):
+            if not future.done():
+                future.set_exception(exc)
+
+    def reject_all(self, exc: Exception):
+        for event_name in list(self._waiters):
+            self.reject(event_name, exc)
+
+    async def wait(self, event_name: str, future: asyncio.Future, timeout: float):
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            waiters = self._waiters.get(event_name)
+            if waiters and future in waiters:
+                waiters.remove(future)
@@ -0,0 +1,66 @@
+import sys
+
+from utils.appearance import AppearanceIndex
+
+
+class RoomMember:
+    """The parts of a ChatRoomSyncCharacter payload the bot actually uses.
+
+    Everything else the server sends (inventory, settings blobs, ...) is
+    dropped unless its key is listed in `keep_fields`, in which case it is
+    kept as-is in `extra`.
+    """
+
+    __slots__ = ("member_number", "name", "owner", "appearance", "extra")
+
+    def __init__(self, member_number: int, name: str, owner: int = 0,
+                 appearance: AppearanceIndex = None, extra: dict = None):
+        self.member_number = member_number
+        self.name = name
+        self.owner = owner
+        self.appearance = appearance if appearance is not None else AppearanceIndex()
+        self.extra = extra
+
+    @classmethod
+    def from_payload(cls, payload: dict, keep_fields=()):
+        ownership = payload.get("Ownership") or {}
+        extra = {k: payload[k] for k in keep_fields if k in payload}
+        return cls(
+            member_number=payload["MemberNumber"],
+            name=payload.get("Name", ""),
+            owner=ownership.get("MemberNumber", 0) or 0,
+            appearance=AppearanceIndex(payload.get("Appearance")),
+            extra=extra or None,
+        )
+
+    def __repr__(self):
+        return f"RoomMember({self.name}({self.member_number}), owner={self.owner}, items={len(self.appearance)})"
+
+
+def deep_sizeof(obj, _seen=None) -> int:
+    """Approximate memory footprint of an object graph in bytes"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, _seen) + deep_sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(i, _seen) for i in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(
+            deep_sizeof(getattr(obj, slot), _seen)
+            for slot in obj.__slots__
+            if hasattr(obj, slot)
+        )
+    return size
+
+
+def memory_report(others: dict) -> dict:
+    """Member count and approximate bytes held by the room-state model"""
+    return {
+        "members": len(others),
+        "bytes": deep_sizeof(others),
+    }
@@ -1,18 +1,106 @@
 import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
 import socketio
 
 from utils.logger import get_logger
+from utils.metrics import Histogram
 
 logger = get_logger(__name__)
 
+# Lower value is sent first
+PRIORITY_CONTROL = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_CHAT = 2
+
+EVENT_PRIORITIES = {
+    "AccountLogin": PRIORITY_CONTROL,
+    "ChatRoomSearch": PRIORITY_CONTROL,
+    "ChatRoomJoin": PRIORITY_CONTROL,
+    "ChatRoomCreate": PRIORITY_CONTROL,
+    "ChatRoomLeave": PRIORITY_CONTROL,
+    "ChatRoomAdmin": PRIORITY_CONTROL,
+    "AccountUpdate": PRIORITY_ACCOUNT,
+    "AccountOwnership": PRIORITY_ACCOUNT,
+    "AccountLovership": PRIORITY_ACCOUNT,
+    "ChatRoomCharacterUpdate": PRIORITY_ACCOUNT,
+}
+
+OVERFLOW_POLICIES = ("block", "drop_new", "drop_lowest")
+
+
 class SocketEventQueue:
-    def __init__(self, sio: socketio.AsyncClient):
+    """Outbound event queue.
+
+    mode="token_bucket" sends events by priority, limited to `rate` events/s
+    with bursts of up to `burst` events. mode="fifo" keeps the original
+    behavior: one event at a time in arrival order, `interval` seconds apart.
+    When `max_size` events are waiting, `overflow` decides what happens to a
+    new one: "block" waits for room, "drop_new" discards it, "drop_lowest"
+    evicts the newest event of the lowest priority class if it ranks below
+    the new one.
+    """
+
+    def __init__(
+        self,
+        sio: socketio.AsyncClient,
+        mode: str = "token_bucket",
+        rate: float = 10.0,
+        burst: int = 5,
+        interval: float = 0.1,
+        max_size: int = 1000,
+        overflow: str = "drop_lowest",
+    ):
         logger.info("Initializing EventQueue...")
+        if mode not in ("token_bucket", "fifo"):
+            raise ValueError(f"Unknown event queue mode: {mode}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
         self.sio = sio
-        self.event_queue = asyncio.Queue()
+        self.mode = mode
+        self.rate = rate
+        self.burst = burst
+        self.interval = interval
+        self.max_size = max_size
+        self.overflow = overflow
+
+        self._heap = []
+        self._pending_keys = Counter()
+        self._counter = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
         self._sender_task = None
+        self.recorder = None  # a TrafficRecorder, set by BCBot when recording
+        self.stats = {
+            "enqueued": 0,
+            "sent": 0,
+            "dropped": 0,
+            "duplicates": 0,
+            "max_depth": 0,
+            "last_wait": 0.0,
+            "max_wait": 0.0,
+            "total_wait": 0.0,
+        }
+        self.wait_histogram = Histogram()  # enqueue-to-emit delay
         logger.info("EventQueue initialized")
 
+    @property
+    def depth(self) -> int:
+        return len(self._heap)
+
+    def get_stats(self) -> dict:
+        """Queue depth, wait times (seconds) and drop counters"""
+        stats = dict(self.stats)
+        stats["depth"] = self.depth
+        stats["mean_wait"] = stats["total_wait"] / stats["sent"] if stats["sent"] else 0.0
+        stats["mode"] = self.mode
+        stats["overflow"] = self.overflow
+        return stats
 
     async def start(self):
         """Start a background task"""
@@ -32,17 +120,103 @@ class SocketEventQueue:
                 logger.info("EventQueue has been shutdown")
             self._sender_task = None
 
-    async def put_event(self, event_name: str, data: dict):
-        """Add an event to the queue"""
-        await self.event_queue.put((event_name, data))
+    def _priority(self, event_name: str) -> int:
+        if self.mode == "fifo":
+            return 0
+        return EVENT_PRIORITIES.get(event_name, PRIORITY_CHAT)
+
+    def _evict_lowest(self, priority: int) -> bool:
+        lowest = max(self._heap, key=lambda entry: (entry[0], entry[1]))
+        if lowest[0] <= priority:
+            return False
+        self._heap.remove(lowest)
+        heapq.heapify(self._heap)
+        self._release_key(lowest[5])
+        logger.warning("EventQueue full, dropped queued %s event", lowest[3])
+        return True
+
+    def _release_key(self, dedupe_key):
+        if dedupe_key is not None:
+            self._pending_keys[dedupe_key] -= 1
+            if self._pending_keys[dedupe_key] <= 0:
+                del self._pending_keys[dedupe_key]
+
+    def is_pending(self, dedupe_key) -> bool:
+        return dedupe_key in self._pending_keys
+
+    async def put_event(self, event_name: str, data: dict, dedupe_key=None) -> bool:
+        """Add an event to the queue. Returns False if it was dropped
+
+        If `dedupe_key` is given and an event with the same key is still
+        waiting to be sent, the new event is dropped as a duplicate.
+        """
+        if dedupe_key is not None and dedupe_key in self._pending_keys:
+            self.stats["duplicates"] += 1
+            return False
+        priority = self._priority(event_name)
+        while len(self._heap) >= self.max_size:
+            if self.overflow == "block":
+                self._not_full.clear()
+                await self._not_full.wait()
+                continue
+            if self.overflow == "drop_lowest" and self._evict_lowest(priority):
+                self.stats["dropped"] += 1
+                break
+            self.stats["dropped"] += 1
+            logger.warning("EventQueue full, dropped new %s event", event_name)
+            return False
+
+        heapq.heappush(
+            self._heap,
+            (priority, next(self._counter), time.monotonic(), event_name, data, dedupe_key),
+        )
+        if dedupe_key is not None:
+            self._pending_keys[dedupe_key] += 1
+        self.stats["enqueued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._heap))
+        self._not_empty.set()
+        return True
+
+    async def _wait_not_empty(self):
+        while not self._heap:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    async def _acquire_token(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
 
     async def _sio_event_sender(self):
         """A background task that sends events from the queue"""
         while True:
             try:
-                event, data = await self.event_queue.get()
-                await self.sio.emit(event, data)
-                await asyncio.sleep(0.1)  # frequency control
+                await self._wait_not_empty()
+                if self.mode == "token_bucket":
+                    await self._acquire_token()
+                _, _, enqueued_at, event, data, dedupe_key = heapq.heappop(self._heap)
+                self._release_key(dedupe_key)
+                self._not_full.set()
+                wait = time.monotonic() - enqueued_at
+                self.stats["last_wait"] = wait
+                self.stats["max_wait"] = max(self.stats["max_wait"], wait)
+                self.stats["total_wait"] += wait
+                self.wait_histogram.observe(wait)
+                try:
+                    await self.sio.emit(event, data)
+                    self.stats["sent"] += 1
+                    # only what reached the socket; dropped and evicted events are not recorded
+                    if self.recorder is not None:
+                        self.recorder.record("out", event, data)
+                except socketio.exceptions.SocketIOError as e:
+                    logger.error("Failed to send %s: %s", event, e)
+                if self.mode == "fifo":
+                    await asyncio.sleep(self.interval)  # frequency control
             except asyncio.CancelledError as e:
                 logger.debug("Event sender is cancelled.", exc_info=e)
                 return
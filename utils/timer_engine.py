@@ -0,0 +1,116 @@
+import asyncio
+import heapq
+import itertools
+
+from utils.clock import Clock
+from utils.logger import get_logger
+from utils.metrics import Histogram
+
+logger = get_logger(__name__)
+
+
+class TimerEngine:
+    """A single background task that fires callbacks at monotonic deadlines.
+
+    Entries live in a min-heap keyed by deadline. Rescheduling or cancelling
+    an entry marks the old heap slot as removed and pushes a new one, so every
+    operation is O(log n) and the task only wakes up when something expires.
+    """
+
+    _REMOVED = object()
+
+    def __init__(self, clock: Clock = None):
+        self.clock = clock or Clock()
+        self.clock.attach(self)
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._callback_tasks = set()
+        self.lateness = Histogram()  # seconds between a deadline and its callback starting
+
+    def now(self) -> float:
+        return self.clock.monotonic()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def schedule(self, key, deadline: float, callback):
+        """Schedule (or re-key) `callback` to be awaited at `deadline`"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            old[-1] = self._REMOVED
+        entry = [deadline, next(self._counter), key, callback]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+        self._ensure_running()
+
+    def cancel(self, key):
+        """Remove a scheduled entry, if any"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[-1] = self._REMOVED
+            # drop the stale slots once they make up most of the heap
+            if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+                self._heap = [e for e in self._heap if e[-1] is not self._REMOVED]
+                heapq.heapify(self._heap)
+
+    def deadline(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def next_deadline(self):
+        while self._heap and self._heap[0][-1] is self._REMOVED:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    async def run_due(self):
+        """Run every callback that is due now, in deadline order"""
+        for _, _, key, callback in self._pop_due(self.now()):
+            await self._invoke(key, callback)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def shutdown(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _pop_due(self, now: float):
+        due = []
+        while self._heap and (self._heap[0][-1] is self._REMOVED or self._heap[0][0] <= now):
+            entry = heapq.heappop(self._heap)
+            if entry[-1] is self._REMOVED:
+                continue
+            del self._entries[entry[2]]
+            self.lateness.observe(now - entry[0])
+            due.append(entry)
+        return due
+
+    async def _invoke(self, key, callback):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error("Timer callback for %s failed: %s", key, e)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            for _, _, key, callback in self._pop_due(self.now()):
+                task = asyncio.create_task(self._invoke(key, callback))
+                self._callback_tasks.add(task)
+                task.add_done_callback(self._callback_tasks.discard)
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            await self.clock.wait(self._wakeup, self._heap[0][0] - self.now())
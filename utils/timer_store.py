@@ -0,0 +1,135 @@
+import asyncio
+import sqlite3
+import threading
+
+from utils.clock import Clock
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TimerStore:
+    """SQLite (WAL) persistence for jail timers, keyed by MemberNumber.
+
+    Changes are buffered in memory and written in one transaction per
+    flush interval, so a burst of commands costs a single commit.
+    Running timers are stored with a wall-clock deadline so that time keeps
+    counting while the bot is down. When `lease` is set, a flush only writes
+    while that lease is still held.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0, clock: Clock = None):
+        self.path = path
+        self.clock = clock or Clock()
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._flush_task = None
+        self._db_lock = threading.Lock()
+        self.lease = None  # a Lease fencing writes, set by HotStandby
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS timers (
+                member_number INTEGER PRIMARY KEY,
+                remaining_seconds REAL NOT NULL,
+                deadline REAL,
+                paused INTEGER NOT NULL,
+                total_seconds REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def save(self, member_number: int, snapshot: dict):
+        """Queue the state of a timer (see JailTimer.snapshot) for writing"""
+        now = self.clock.time()
+        deadline = now + snapshot["remaining_seconds"] if snapshot["running"] else None
+        self._pending[member_number] = (
+            member_number,
+            snapshot["remaining_seconds"],
+            deadline,
+            0 if snapshot["running"] else 1,
+            snapshot["total_seconds"],
+            now,
+        )
+
+    def delete(self, member_number: int):
+        """Queue the removal of a timer"""
+        self._pending[member_number] = None
+
+    def load_all(self) -> dict:
+        """Load every stored timer, with remaining time counted up to now"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT member_number, remaining_seconds, deadline, paused, total_seconds FROM timers"
+            ).fetchall()
+        now = self.clock.time()
+        timers = {}
+        for member_number, remaining, deadline, paused, total in rows:
+            if not paused:
+                remaining = max(0, deadline - now)
+            timers[member_number] = {
+                "remaining_seconds": remaining,
+                "running": not paused,
+                "total_seconds": total,
+            }
+        logger.info("Loaded %s timers from %s", len(timers), self.path)
+        return timers
+
+    def _write(self, batch: dict):
+        upserts = [row for row in batch.values() if row is not None]
+        deletes = [(k,) for k, row in batch.items() if row is None]
+        with self._db_lock, self._conn:
+            if self.lease is not None and not self.lease.holds(self._conn):
+                logger.warning("Lease %s is no longer ours, dropped %s timer changes", self.lease.name, len(batch))
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO timers VALUES (?, ?, ?, ?, ?, ?)", upserts
+            )
+            self._conn.executemany("DELETE FROM timers WHERE member_number = ?", deletes)
+
+    def discard_pending(self):
+        """Drop queued changes, e.g. after another process took over the store"""
+        if self._pending:
+            logger.warning("Discarding %s unflushed timer changes", len(self._pending))
+        self._pending = {}
+
+    async def flush(self):
+        """Write all queued changes in a single transaction"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except BaseException:
+            # keep the batch for the next flush; changes queued meanwhile are newer
+            self._pending = {**batch, **self._pending}
+            raise
+        logger.debug("Flushed %s timer changes", len(batch))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error("Failed to flush timers: %s", e)
+
+    async def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        self._conn.close()
@@ -0,0 +1,58 @@
+import gzip
+import json
+import time
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TrafficRecorder:
+    """Writes socket.io traffic to a gzip-compressed JSON-lines file.
+
+    Each line is `{"t": seconds since start, "dir": "in"|"out", "event": ...,
+    "data": ...}`. The gzip stream is sync-flushed every `flush_interval`
+    seconds so the file can be read while it is still being written.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._started = time.monotonic()
+        self._last_flush = self._started
+        self.count = 0
+        logger.info("Recording socket traffic to %s", path)
+
+    def record(self, direction: str, event: str, data=None):
+        now = time.monotonic()
+        if event == "AccountLogin" and isinstance(data, dict):
+            data = {**data, "Password": "<redacted>"}
+        line = json.dumps(
+            {"t": round(now - self._started, 6), "dir": direction, "event": event, "data": data},
+            ensure_ascii=False,
+            default=str,
+        )
+        self._file.write(line + "\n")
+        self.count += 1
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            logger.info("Recorded %s events to %s", self.count, self.path)
+
+
+def read_traffic(path: str):
+    """Yield recorded events one at a time; tolerates a truncated last line"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+        except EOFError:
+            return